@@ -17,4 +17,4 @@ fi
 echo "🎉 Cleanup complete!"
 echo ""
 echo "The outputs folder is now empty and ready for new experiments."
-echo "Run: ./experiments/scripts/run_all_experiments.sh"
\ No newline at end of file
+echo "Run: python experiments/scripts/run_all_experiments.py"
\ No newline at end of file
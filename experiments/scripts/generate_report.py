@@ -1,9 +1,14 @@
 import re
 import json
+import html
 from pathlib import Path
 import sys
 import csv
+import io
+import tempfile
+import threading
 import unittest
+from functools import lru_cache
 
 # Define the headers for the CSV file
 CSV_HEADERS = [
@@ -31,26 +36,42 @@ CSV_HEADERS = [
     "roi_params",
 ]
 
+# Pre-compiled patterns used while parsing run.log
+_DRAWDOWN_RE = re.compile(r'([\d.]+)\s+USDT\s+([\d.]+)%')
+# Per-thread StringIO reused by format_csv_row
+_TLS = threading.local()
+
+# Experiment metadata written by run_experiment.py at the start of run.log lines;
+# the matching group name is the metadata key
+_METADATA_RE = re.compile(
+    r"(?:Start Date: (?P<start_date>\d{8})"
+    r"|IS Length \(days\): (?P<is_days>\d+)"
+    r"|OOS Length \(days\): (?P<oos_days>\d+)"
+    r"|Epochs: (?P<epochs>\d+)"
+    r"|Loss Function: (?P<loss_function>.+))"
+)
+
 def parse_summary_metrics(report_content):
     metrics = {}
     # First check if there's actually a SUMMARY METRICS section
-    if "SUMMARY METRICS" not in report_content:
-        return metrics
-    
-    # Extract only the SUMMARY METRICS section
-    metrics_section_match = re.search(r"SUMMARY METRICS\s*\n(.*?)(?=\n\n|\n\s*\n|$)", report_content, re.DOTALL)
-    if not metrics_section_match:
+    start = report_content.find("SUMMARY METRICS")
+    if start < 0:
         return metrics
     
-    metrics_section = metrics_section_match.group(0)
+    # Extract only the SUMMARY METRICS section: the lines after the title up to the first blank line
+    metrics_section = []
+    for line in report_content[start:].splitlines()[1:]:
+        if line.strip():
+            metrics_section.append(line)
+        elif metrics_section:
+            break
     
-    # Regex to find all rows in the summary metrics table (handles both unicode and ASCII)
-    matches = re.findall(r"[│\|] (.*?) [│\|] (.*?) [│\|]", metrics_section)
-    for match in matches:
-        key = match[0].strip()
-        value = match[1].strip()
-        if key and value and key != "Metric":  # Skip header row
-            metrics[key] = value
+    # Split each two-column row of the summary metrics table (handles both unicode and ASCII)
+    for line in metrics_section:
+        parts = [p.strip() for p in line.replace('|', '│').split('│')]
+        parts = [p for p in parts if p]
+        if len(parts) == 2 and parts[0] != "Metric":  # Skip header row
+            metrics[parts[0]] = parts[1]
     
     # Validate that we got actual metrics, not random table data
     expected_keys = ["Total profit %", "Absolute Drawdown", "Sortino", "Sharpe", "Calmar", "Profit factor"]
@@ -59,16 +80,20 @@ def parse_summary_metrics(report_content):
     
     return metrics
 
-def parse_strategy_summary_table(content, strategy_name):
+def parse_strategy_summary_table(lines, strategy_name):
     """Parse metrics from STRATEGY SUMMARY table for strategies with 0 or few trades"""
     metrics = {}
     
     # Find lines that contain the strategy name in a table format
-    lines = content.split('\n')
     for line in lines:
         if strategy_name in line and '│' in line:
+            row = line.strip('│ ')
+            # The strategy name must be in the first column; skip other rows before splitting
+            if not row.startswith(strategy_name):
+                continue
+            
             # Split the line by │ and clean up
-            parts = re.split(r'\s*│\s*', line.strip('│ '))
+            parts = [p.strip() for p in row.split('│')]
             
             if len(parts) >= 8 and parts[0] == strategy_name:
                 trades = parts[1]
@@ -84,7 +109,7 @@ def parse_strategy_summary_table(content, strategy_name):
                 win_pct = win_numbers[-1] if win_numbers else "0"
                 
                 # Extract drawdown values
-                drawdown_match = re.search(r'([\d.]+)\s+USDT\s+([\d.]+)%', drawdown)
+                drawdown_match = _DRAWDOWN_RE.search(drawdown)
                 if drawdown_match:
                     drawdown_usdt = drawdown_match.group(1)
                     drawdown_pct = drawdown_match.group(2)
@@ -109,6 +134,16 @@ def parse_strategy_summary_table(content, strategy_name):
     
     return metrics
 
+def _compact_json(obj):
+    """Serialize obj as compact JSON"""
+    return json.dumps(obj, separators=(',', ':'))
+
+@lru_cache(maxsize=256)
+def _load_json_cached(path, mtime_ns):
+    """Parse a JSON file once per (path, mtime); the result must not be mutated"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
 def load_strategy_parameters(experiment_dir, strategy_name):
     """Load optimization parameters from JSON files"""
     params = {
@@ -121,8 +156,7 @@ def load_strategy_parameters(experiment_dir, strategy_name):
     json_file = experiment_dir / f"{strategy_name}.json"
     if json_file.exists():
         try:
-            with open(json_file, 'r') as f:
-                param_data = json.load(f)
+            param_data = _load_json_cached(str(json_file), json_file.stat().st_mtime_ns)
                 
             if "params" in param_data:
                 p = param_data["params"]
@@ -133,18 +167,15 @@ def load_strategy_parameters(experiment_dir, strategy_name):
                 
                 # Extract buy parameters (convert to compact string)
                 if "buy" in p and p["buy"]:
-                    buy_params = {k: v for k, v in p["buy"].items()}
-                    params["buy_params"] = json.dumps(buy_params, separators=(',', ':'))
+                    params["buy_params"] = _compact_json(p["buy"])
                 
                 # Extract sell parameters (convert to compact string)  
                 if "sell" in p and p["sell"]:
-                    sell_params = {k: v for k, v in p["sell"].items()}
-                    params["sell_params"] = json.dumps(sell_params, separators=(',', ':'))
+                    params["sell_params"] = _compact_json(p["sell"])
                 
                 # Extract ROI parameters (convert to compact string)
                 if "roi" in p and p["roi"]:
-                    roi_params = {k: v for k, v in p["roi"].items()}
-                    params["roi_params"] = json.dumps(roi_params, separators=(',', ':'))
+                    params["roi_params"] = _compact_json(p["roi"])
                     
         except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
             # If we can't load parameters, keep N/A values
@@ -152,8 +183,59 @@ def load_strategy_parameters(experiment_dir, strategy_name):
     
     return params
 
-def generate_html_report(experiment_dir, results):
-    html_content = f"""\
+def scan_log(log_file, strategy_name):
+    """Scan run.log in a single streaming pass.
+
+    Returns the backtest report block for strategy_name keyed by its
+    "Result for strategy" header, the experiment metadata, and the table rows
+    mentioning strategy_name needed by the STRATEGY SUMMARY fallback. When the
+    log holds several blocks for strategy_name the last one wins. Blocks and
+    rows for other strategies are skipped without being buffered.
+    """
+    reports = {}
+    metadata = {}
+    table_lines = []
+    pending_keys = set(_METADATA_RE.groupindex)
+    header = None
+    capturing = False
+    report_lines = []
+
+    with open(log_file, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+
+            if pending_keys:
+                match = _METADATA_RE.match(line)
+                if match and match.lastgroup in pending_keys:
+                    metadata[match.lastgroup] = match.group(match.lastgroup)
+                    pending_keys.discard(match.lastgroup)
+
+            if '│' in line and strategy_name in line:
+                table_lines.append(line)
+
+            if header is None:
+                pos = line.find("Result for strategy ")
+                if pos >= 0:
+                    header = line[pos:]
+                    capturing = header.replace("Result for strategy ", "").strip() == strategy_name
+                    report_lines = []
+            else:
+                pos = line.find("STRATEGY SUMMARY")
+                if pos >= 0:
+                    if capturing:
+                        # A later block for the same strategy replaces the earlier one
+                        report_lines.append(line[:pos])
+                        reports[header] = '\n'.join(report_lines)
+                    header = None
+                elif capturing:
+                    report_lines.append(line)
+
+    return reports, metadata, table_lines
+
+def generate_html_report(experiment_dir, results, log_file):
+    # Write each piece straight to the file instead of growing one string
+    with open(experiment_dir / "report.html", "w") as f:
+        f.write(f"""\
     <html>
     <head>
         <title>Experiment Report: {experiment_dir.name}</title>
@@ -168,32 +250,36 @@ def generate_html_report(experiment_dir, results):
     </head>
     <body>
         <h1>Experiment Report: {experiment_dir.name}</h1>
-    """
+    """)
 
-    for strategy, result in results.items():
-        html_content += f"<h2>{strategy}</h2>"
-        if 'metrics' in result:
-            html_content += "<h3>Summary Metrics</h3>"
-            html_content += "<table>"
-            html_content += "<tr><th>Metric</th><th>Value</th></tr>"
-            for key, value in result['metrics'].items():
-                html_content += f"<tr><td>{key}</td><td>{value}</td></tr>"
-            html_content += "</table>"
-
-        if 'report' in result:
-            html_content += "<h3>Full Report</h3>"
-            html_content += f"<pre>{result['report']}</pre>"
-
-    log_content = (experiment_dir / 'run.log').read_text()
-    html_content += "<h2>Full Log</h2>"
-    html_content += f"<pre>{log_content}</pre>"
-
-    html_content += """\
+        for strategy, result in results.items():
+            parts = [f"<h2>{strategy}</h2>"]
+            if 'metrics' in result:
+                parts.append("<h3>Summary Metrics</h3>")
+                parts.append("<table>")
+                parts.append("<tr><th>Metric</th><th>Value</th></tr>")
+                for key, value in result['metrics'].items():
+                    parts.append(f"<tr><td>{key}</td><td>{value}</td></tr>")
+                parts.append("</table>")
+
+            if 'report' in result:
+                parts.append("<h3>Full Report</h3>")
+                parts.append(f"<pre>{html.escape(result['report'], quote=False)}</pre>")
+            f.write(''.join(parts))
+
+        f.write("<h2>Full Log</h2>")
+        f.write("<pre>")
+        # Copy the log in escaped 1 MiB chunks so memory stays bounded on huge logs
+        with open(log_file, 'r', buffering=1 << 20) as lf:
+            while True:
+                chunk = lf.read(1 << 20)
+                if not chunk:
+                    break
+                f.write(html.escape(chunk, quote=False))
+        f.write("""</pre>\
     </body>
     </html>
-    """
-    with open(experiment_dir / "report.html", "w") as f:
-        f.write(html_content)
+    """)
 
 def load_experiment_status(experiment_dir):
     """Load status information from hyperopt_status.txt file"""
@@ -212,26 +298,14 @@ def load_experiment_status(experiment_dir):
     
     return status_dict
 
-def get_csv_row_as_string(experiment_dir, results, primary_strategy_name, experiment_index):
-    import io
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=CSV_HEADERS)
-    writer.writeheader()  # Write headers so we can get the data row
-
-    log_content = (experiment_dir / 'run.log').read_text()
-    
-    # Extract all needed parameters from the log
-    start_date_match = re.search(r"Start Date: (\d{8})", log_content)
-    is_days_match = re.search(r"IS Length \(days\): (\d+)", log_content)
-    oos_days_match = re.search(r"OOS Length \(days\): (\d+)", log_content)
-    epochs_match = re.search(r"Epochs: (\d+)", log_content)
-    loss_function_match = re.search(r"Loss Function: (.+)", log_content)
-    
-    start_date = start_date_match.group(1) if start_date_match else "N/A"
-    is_days = is_days_match.group(1) if is_days_match else "N/A"
-    oos_days = oos_days_match.group(1) if oos_days_match else "N/A"
-    epochs = epochs_match.group(1) if epochs_match else "N/A"
-    loss_function = loss_function_match.group(1) if loss_function_match else "N/A"
+def get_csv_row(experiment_dir, results, primary_strategy_name, experiment_index, log_metadata):
+    """Summary row for an experiment as a list of values in CSV_HEADERS order"""
+    # Parameters extracted from the log by scan_log()
+    start_date = log_metadata.get("start_date", "N/A")
+    is_days = log_metadata.get("is_days", "N/A")
+    oos_days = log_metadata.get("oos_days", "N/A")
+    epochs = log_metadata.get("epochs", "N/A")
+    loss_function = log_metadata.get("loss_function", "N/A")
     
     # Load status information
     status_dict = load_experiment_status(experiment_dir)
@@ -296,67 +370,120 @@ def get_csv_row_as_string(experiment_dir, results, primary_strategy_name, experi
             "Win %": "N/A",
         })
     
-    writer.writerow(row)
-    
-    lines = output.getvalue().splitlines()
-    if len(lines) > 1:
-        # Return single data row (skip header)
-        return lines[1] + '\n'
-    else:
-        return ""  # No data row to return
+    return [row.get(h, "") for h in CSV_HEADERS]
 
-class TestReportGenerator(unittest.TestCase):
-    def test_regex_compiles(self):
-        try:
-            re.compile(r"(Result for strategy .*?)\n(.*?)\n\s+STRATEGY SUMMARY")
-        except re.error as e:
-            self.fail(f"Regex failed to compile: {e}")
+def format_csv_row(row):
+    """Format a summary row as one CSV line; csv.writer handles quoting"""
+    output = getattr(_TLS, 'buf', None)
+    if output is None:
+        output = _TLS.buf = io.StringIO()
+    output.seek(0)
+    output.truncate()
+    csv.writer(output, lineterminator='\n').writerow(row)
+    return output.getvalue()
 
-def main():
-    if len(sys.argv) > 1 and sys.argv[1] == 'test':
-        suite = unittest.TestLoader().loadTestsFromTestCase(TestReportGenerator)
-        runner = unittest.TextTestRunner()
-        runner.run(suite)
-        sys.exit(0)
+def generate_report_for(experiment_dir, primary_strategy_name, experiment_index):
+    """Write report.html for an experiment and return its summary row.
 
-    if len(sys.argv) != 4:
-        print("Usage: python3 generate_report.py <experiment_directory> <primary_strategy_name> <experiment_index>")
-        sys.exit(1)
+    The row is a list in CSV_HEADERS order; format_csv_row() turns it into a
+    CSV line.
 
-    experiment_dir = Path(sys.argv[1])
-    primary_strategy_name = sys.argv[2]
-    experiment_index = int(sys.argv[3])
+    Raises FileNotFoundError if the experiment has no run.log.
+    """
     log_file = experiment_dir / "run.log"
-
     if not log_file.exists():
-        print(f"Log file not found in {experiment_dir}")
-        sys.exit(1)
-
-    with open(log_file, 'r') as f:
-        content = f.read()
+        raise FileNotFoundError(f"Log file not found in {experiment_dir}")
 
     results = {}
-    # More flexible regex to handle different output formats
-    # Look for either the full "Result for strategy" format or just SUMMARY METRICS sections
-    backtest_reports = re.findall(r"(Result for strategy .*?)\n(.*?)STRATEGY SUMMARY", content, re.DOTALL)
+    # Collect the primary "Result for strategy ... STRATEGY SUMMARY" block and
+    # the experiment metadata in one pass over the log
+    backtest_reports, log_metadata, table_lines = scan_log(log_file, primary_strategy_name)
     
-    for report in backtest_reports:
-        strategy_name = report[0]
-        report_content = report[1]
+    for strategy_name, report_content in backtest_reports.items():
         metrics = parse_summary_metrics(report_content)
         
         # If no metrics found from SUMMARY METRICS section, try the strategy summary table
         if not metrics:
             strategy_name_raw = strategy_name.replace("Result for strategy ", "")
-            metrics = parse_strategy_summary_table(content, strategy_name_raw)
+            metrics = parse_strategy_summary_table(table_lines, strategy_name_raw)
         
         results[strategy_name] = {"report": report_content, "metrics": metrics}
 
-    generate_html_report(experiment_dir, results)
-    print(get_csv_row_as_string(experiment_dir, results, primary_strategy_name, experiment_index), end='')
-    sys.stdout.flush()
+    generate_html_report(experiment_dir, results, log_file)
+    return get_csv_row(experiment_dir, results, primary_strategy_name, experiment_index, log_metadata)
 
-    
+_SAMPLE_LOG = """\
+Strategy: QFLRSI_Strategy
+Start Date: 20240101
+IS Length (days): 60
+OOS Length (days): 30
+Epochs: 100
+Loss Function: SharpeHyperOptLoss
+Result for strategy QFLRSI_Strategy
+stale block
+                 STRATEGY SUMMARY
+Result for strategy OtherStrategy
+other block
+                 STRATEGY SUMMARY
+Result for strategy QFLRSI_Strategy
+│ Total profit %  │ 1.23%  │
+│ Sharpe          │ 0.45   │
+                 STRATEGY SUMMARY
+│ QFLRSI_Strategy │ 0 │ 0.00 │ 0.000 │ 0.00 │ 0:00 │ 0 0 0 0 │ 0 USDT  0.00% │
+"""
+
+class TestReportGenerator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_file = Path(self.tmp.name) / "run.log"
+        self.log_file.write_text(_SAMPLE_LOG)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_metadata_re(self):
+        match = _METADATA_RE.match("IS Length (days): 60")
+        self.assertEqual((match.lastgroup, match.group(match.lastgroup)), ("is_days", "60"))
+        self.assertIsNone(_METADATA_RE.match("Strategy: QFLRSI_Strategy"))
+
+    def test_scan_log(self):
+        reports, metadata, table_lines = scan_log(self.log_file, "QFLRSI_Strategy")
+        self.assertEqual(metadata, {
+            "start_date": "20240101", "is_days": "60", "oos_days": "30",
+            "epochs": "100", "loss_function": "SharpeHyperOptLoss",
+        })
+        # Only the primary strategy's block is kept, and the last one wins
+        self.assertEqual(list(reports), ["Result for strategy QFLRSI_Strategy"])
+        report = reports["Result for strategy QFLRSI_Strategy"]
+        self.assertNotIn("stale block", report)
+        self.assertEqual(parse_summary_metrics("SUMMARY METRICS\n" + report),
+                         {"Total profit %": "1.23%", "Sharpe": "0.45"})
+        self.assertEqual(len(table_lines), 1)
+        self.assertEqual(parse_strategy_summary_table(table_lines, "QFLRSI_Strategy")["Sharpe"], "0.00")
+
+    def test_format_csv_row(self):
+        row = ["1", "QFLRSI_Strategy", '{"buy_rsi":30,"rsi_source":"close"}']
+        self.assertEqual(format_csv_row(row), '1,QFLRSI_Strategy,"{""buy_rsi"":30,""rsi_source"":""close""}"\n')
+        self.assertEqual(next(csv.reader(io.StringIO(format_csv_row(row)))), row)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        suite = unittest.TestLoader().loadTestsFromTestCase(TestReportGenerator)
+        runner = unittest.TextTestRunner()
+        result = runner.run(suite)
+        sys.exit(0 if result.wasSuccessful() else 1)
+
+    if len(sys.argv) != 4:
+        print("Usage: python3 generate_report.py <experiment_directory> <primary_strategy_name> <experiment_index>")
+        sys.exit(1)
+
+    try:
+        row = generate_report_for(Path(sys.argv[1]), sys.argv[2], int(sys.argv[3]))
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit(1)
+    print(format_csv_row(row), end='')
+    sys.stdout.flush()
 
 if __name__ == "__main__":
     main()
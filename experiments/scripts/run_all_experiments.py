@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Python orchestrator for running all freqtrade experiments.
-Replaces the bash run_all_experiments.sh for better control and reliability.
+Runs each line of experiments.conf: hyperopt, OOS backtest and report.
 """
 
 import os
@@ -10,37 +10,71 @@ import subprocess
 import csv
 import re
 import argparse
+import datetime
+import itertools
+import operator
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
+import run_experiment as experiment_runner
+from generate_report import CSV_HEADERS
+
 # Configuration
 CONFIG_FILE = "experiments/experiments.conf"
 SUMMARY_CSV = "experiments/outputs/summary.csv"
+EXPERIMENT_TIMEOUT = 3600  # 1 hour timeout
+CSV_FLUSH_EVERY = 8  # Completed CSV rows buffered before writing to summary.csv
+HYPEROPTS_DIR = "user_data/hyperopts"
+
+# Loss functions shipped with freqtrade; custom ones are looked up in HYPEROPTS_DIR
+BUILTIN_LOSS_FUNCTIONS = {
+    "ShortTradeDurHyperOptLoss", "OnlyProfitHyperOptLoss",
+    "SharpeHyperOptLoss", "SharpeHyperOptLossDaily",
+    "SortinoHyperOptLoss", "SortinoHyperOptLossDaily",
+    "CalmarHyperOptLoss", "MaxDrawDownHyperOptLoss",
+    "MaxDrawDownRelativeHyperOptLoss", "MaxDrawDownPerPairHyperOptLoss",
+    "ProfitDrawDownHyperOptLoss", "MultiMetricHyperOptLoss",
+}
+
+def freqtrade_container_running():
+    """Check whether the compose `freqtrade` container is up"""
+    result = subprocess.run(["docker", "ps", "-q", "-f", "name=^freqtrade$"],
+                            capture_output=True, text=True)
+    return bool(result.stdout.strip())
 
 def create_summary_csv_if_needed():
     """Create summary.csv with headers if it doesn't exist"""
     if not Path(SUMMARY_CSV).exists():
-        # Import CSV headers from generate_report.py
-        sys.path.append(str(Path('experiments/scripts').resolve()))
-        from generate_report import CSV_HEADERS
-        
         os.makedirs(os.path.dirname(SUMMARY_CSV), exist_ok=True)
         with open(SUMMARY_CSV, 'w', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(CSV_HEADERS)
         print(f"Created {SUMMARY_CSV} with headers")
 
+def known_loss_functions():
+    """Built-in loss functions plus the classes defined in user_data/hyperopts"""
+    names = set(BUILTIN_LOSS_FUNCTIONS)
+    for path in Path(HYPEROPTS_DIR).glob("*.py"):
+        names.update(re.findall(r"^class\s+(\w+)", path.read_text(), re.MULTILINE))
+    return names
+
 def parse_experiment_line(line):
-    """Parse an experiment configuration line"""
+    """Parse and validate an experiment configuration line.
+
+    Returns None for blank and comment lines; raises ValueError if the line is
+    malformed, so bad config is reported before any experiment runs.
+    """
     line = line.strip()
     if not line or line.startswith('#'):
         return None
     
     parts = line.split()
     if len(parts) != 9:
-        print(f"Invalid experiment line: {line}")
-        return None
+        raise ValueError(f"expected 9 fields, got {len(parts)}")
     
-    return {
+    experiment = {
         'strategy': parts[0],
         'pair': parts[1], 
         'timeframe': parts[2],
@@ -51,8 +85,24 @@ def parse_experiment_line(line):
         'spaces': parts[7],
         'loss_function': parts[8]
     }
+    
+    for field in ('is_length', 'oos_length', 'epochs'):
+        try:
+            experiment[field] = int(experiment[field])
+        except ValueError:
+            raise ValueError(f"{field} must be an integer, got {experiment[field]!r}") from None
+        if experiment[field] <= 0:
+            raise ValueError(f"{field} must be positive, got {experiment[field]}")
+    try:
+        # strptime alone accepts short forms such as 2024011
+        if not re.fullmatch(r"\d{8}", experiment['start_date']):
+            raise ValueError
+        datetime.datetime.strptime(experiment['start_date'], '%Y%m%d')
+    except ValueError:
+        raise ValueError(f"start_date must be YYYYMMDD, got {experiment['start_date']!r}") from None
+    return experiment
 
-def run_experiment(experiment, verbose=False):
+def run_experiment(experiment, verbose=False, docker_exec=False, hyperopt_lock=None):
     """Run a single experiment and return CSV output"""
     strategy = experiment['strategy']
     pair = experiment['pair']
@@ -68,75 +118,25 @@ def run_experiment(experiment, verbose=False):
     print(f"Running experiment: {strategy} {pair} {timeframe} {start_date} {is_length} {oos_length} {epochs} {spaces} {loss_function}")
     
     try:
-        # Run the experiment script
-        cmd = [
-            sys.executable, "experiments/scripts/run_experiment.py",
-            strategy, pair, timeframe, start_date, is_length, oos_length, epochs, spaces, loss_function, str(exp_index)
-        ]
+        # Run the experiment in-process; progress output is only shown in verbose mode
+        summary_row, exp_dir = experiment_runner.run_experiment(
+            strategy, pair, timeframe, start_date, is_length, oos_length, epochs, spaces, loss_function, exp_index,
+            verbose=verbose,
+            quiet=not verbose,
+            timeout=EXPERIMENT_TIMEOUT,
+            docker_exec=docker_exec,
+            hyperopt_lock=hyperopt_lock
+        )
         
-        # Add verbose flag if enabled
-        if verbose:
-            cmd.append("--verbose")
+        # The report row comes back as a list; no CSV parsing needed
+        csv_rows = [summary_row] if summary_row else []
         
-        if verbose:
-            # In verbose mode, don't capture output so commands are visible
-            result = subprocess.run(
-                cmd,
-                text=True,
-                timeout=3600  # 1 hour timeout
-            )
-            # For verbose mode, we need to find the latest experiment directory and get CSV
-            exp_index = experiment['index']
-            strategy_base = Path(f"experiments/outputs/{exp_index}.{experiment['strategy']}")
-            if strategy_base.exists():
-                pair_dir = strategy_base / experiment['pair'].replace('/', '-') / experiment['timeframe']
-                if pair_dir.exists():
-                    latest_dir = max(pair_dir.glob('*'), key=lambda x: x.stat().st_mtime, default=None)
-                    if latest_dir:
-                        report_cmd = [
-                            sys.executable, "experiments/scripts/generate_report.py",
-                            str(latest_dir),
-                            experiment['strategy'],
-                            str(exp_index)
-                        ]
-                        report_result = subprocess.run(report_cmd, capture_output=True, text=True)
-                        csv_output = report_result.stdout
-                    else:
-                        csv_output = ""
-                else:
-                    csv_output = ""
-            else:
-                csv_output = ""
-        else:
-            # Normal mode - capture output as before
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=3600  # 1 hour timeout
-            )
-            csv_output = result.stdout
-        
-        # Extract CSV lines from output
-        csv_lines = []
-        for line in csv_output.split('\n'):
-            line = line.strip()
-            # Look for lines that have the current strategy name in the second column (after experiment_num)
-            if line and ',' in line:
-                parts = line.split(',')
-                if len(parts) >= 2 and (parts[1] == strategy or parts[1] == f'{strategy}Short'):
-                    csv_lines.append(line)
-        
-        if csv_lines:
-            print(f"✅ Completed: {strategy} ({len(csv_lines)} CSV rows)")
-            return csv_lines
+        if csv_rows:
+            print(f"✅ Completed: {strategy} ({len(csv_rows)} CSV rows)")
+            return csv_rows
         else:
-            print(f"❌ Failed: {strategy} (no CSV output found)")
-            if not verbose:
-                print("STDOUT:", result.stdout[-500:])  # Last 500 chars
-                print("STDERR:", result.stderr[-500:])  # Last 500 chars
-            else:
-                print("CSV OUTPUT:", csv_output[-500:])  # Last 500 chars of CSV output
+            print(f"❌ Failed: {strategy} (report generation failed)")
+            print(f"See log: {exp_dir / 'run.log'}")
             return []
             
     except subprocess.TimeoutExpired:
@@ -146,14 +146,59 @@ def run_experiment(experiment, verbose=False):
         print(f"❌ Failed: {strategy} (error: {e})")
         return []
 
-def append_csv_rows(csv_lines):
-    """Append CSV rows to summary file"""
-    if not csv_lines:
+# summary.csv columns that identify an experiment, and the matching config keys
+RESUME_KEY_COLUMNS = ["experiment_num", "strategy", "pair", "timeframe", "start_date",
+                      "IS_days", "OOS_days", "epochs", "loss_function"]
+RESUME_KEY_FIELDS = ["index", "strategy", "pair", "timeframe", "start_date",
+                     "is_length", "oos_length", "epochs", "loss_function"]
+
+def experiment_key(experiment):
+    """Identity of a configured experiment, comparable with load_completed_experiments()"""
+    return tuple(str(experiment[field]) for field in RESUME_KEY_FIELDS)
+
+def load_completed_experiments():
+    """Keys of experiments that already have a row in summary.csv"""
+    if not Path(SUMMARY_CSV).exists():
+        return set()
+    with open(SUMMARY_CSV, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        # Files written before a key column existed cannot be matched
+        if not all(col in header for col in RESUME_KEY_COLUMNS):
+            return set()
+        # Pull only the key columns by position instead of building a dict per row
+        key_of = operator.itemgetter(*(header.index(col) for col in RESUME_KEY_COLUMNS))
+        width = len(header)
+        return {key_of(row) for row in reader if len(row) >= width}
+
+def estimated_cost(experiment):
+    """Rough relative run time of an experiment: hyperopt epochs x in-sample days"""
+    return experiment['epochs'] * experiment['is_length']
+
+def append_csv_rows(summary_fh, writer, csv_rows):
+    """Append parsed CSV rows through the summary file's writer"""
+    if not csv_rows:
         return
     
-    with open(SUMMARY_CSV, 'a', newline='') as f:
-        for line in csv_lines:
-            f.write(line + '\n')
+    writer.writerows(csv_rows)
+    summary_fh.flush()
+
+class HyperoptLock:
+    """Lock held around each hyperopt; once closed, waiting experiments fail instead of starting one"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self.closed:
+            self._lock.release()
+            raise RuntimeError("run interrupted")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
 
 def main():
     """Main orchestrator function"""
@@ -161,6 +206,15 @@ def main():
     parser = argparse.ArgumentParser(description="Run all freqtrade experiments")
     parser.add_argument("--verbose", action="store_true", 
                         help="Print full commands for hyperopt and backtest calls")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of experiments to run concurrently (default: 1). "
+                             "Hyperopt writes its parameters to user_data/strategies/<strategy>.json, "
+                             "so values above 1 are refused when a strategy appears more than once")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip experiments that already have a row in summary.csv")
+    parser.add_argument("--docker-exec", action="store_true",
+                        help="Run freqtrade commands with `docker exec` in one long-lived "
+                             "freqtrade container instead of `docker-compose run --rm` per command")
     args = parser.parse_args()
     
     print("🚀 Starting Python experiment orchestrator...")
@@ -176,41 +230,137 @@ def main():
         sys.exit(1)
     
     experiments = []
+    errors = []
     with open(CONFIG_FILE, 'r') as f:
         for line_num, line in enumerate(f, 1):
-            experiment = parse_experiment_line(line)
+            try:
+                experiment = parse_experiment_line(line)
+            except ValueError as e:
+                errors.append(f"  line {line_num}: {e}: {line.strip()}")
+                continue
             if experiment:
                 experiments.append(experiment)
     
+    # Refuse to start a sweep that would fail partway through on a bad line
+    if errors:
+        print(f"❌ Invalid experiment lines in {CONFIG_FILE}:")
+        print("\n".join(errors))
+        sys.exit(1)
+    
     if not experiments:
         print("❌ No valid experiments found in configuration file")
         sys.exit(1)
     
     print(f"Found {len(experiments)} experiments to run")
     
+    # The known list can miss loss functions freqtrade finds elsewhere (other
+    # versions, a custom --hyperopt-path), so unknown names only get a warning
+    unknown_losses = sorted({e['loss_function'] for e in experiments} - known_loss_functions())
+    if unknown_losses:
+        print(f"⚠️  Loss functions not built into freqtrade or defined in {HYPEROPTS_DIR}: "
+              f"{', '.join(unknown_losses)}")
+    
     # Process each experiment
     successful = 0
     failed = 0
     
+    # Add experiment index to experiment data
     for i, experiment in enumerate(experiments, 1):
-        print(f"\n--- Processing experiment {i}/{len(experiments)} ---")
-        
-        # Add experiment index to experiment data
         experiment['index'] = i
-        csv_lines = run_experiment(experiment, verbose=args.verbose)
+    
+    # Resume an interrupted run: experiments are matched on their number and settings
+    skipped = 0
+    to_run = experiments
+    if args.resume:
+        completed = load_completed_experiments()
+        to_run = [e for e in experiments if experiment_key(e) not in completed]
+        skipped = len(experiments) - len(to_run)
+        print(f"Resuming: skipping {skipped} experiments already in {SUMMARY_CSV}")
+    
+    def process_experiment(experiment):
+        print(f"\n--- Processing experiment {experiment['index']}/{len(experiments)} ---")
+        return run_experiment(experiment, verbose=args.verbose, docker_exec=args.docker_exec,
+                              hyperopt_lock=hyperopt_lock)
+    
+    max_workers = max(1, min(args.jobs, len(to_run), os.cpu_count() or 1))
+    # Experiments of the same strategy share its hyperopt parameter file, so they
+    # can only run one after the other
+    if max_workers > 1:
+        counts = Counter(e['strategy'] for e in to_run)
+        repeated = sorted(strategy for strategy, count in counts.items() if count > 1)
+        if repeated:
+            print(f"❌ --jobs {args.jobs} needs each strategy to appear once in {CONFIG_FILE}; "
+                  f"repeated: {', '.join(repeated)}")
+            print("Run with --jobs 1 or split the configuration")
+            sys.exit(1)
+    # freqtrade runs one hyperopt at a time (user_data/hyperopt.lock) and a second
+    # one exits 0 without optimizing, so only the backtest and report stages overlap
+    hyperopt_lock = HyperoptLock()
+    # Reuse one container for every freqtrade command; stop it afterwards only
+    # if it was not already running (e.g. as the webserver)
+    started_container = False
+    if args.docker_exec and not freqtrade_container_running():
+        subprocess.run(["docker-compose", "up", "-d", "freqtrade"], check=True)
+        started_container = True
+    try:
+        with open(SUMMARY_CSV, 'a', newline='', buffering=1 << 20) as summary_fh:
+            # With several workers, start the longest experiments first so the slots
+            # finish close together; experiment numbers still follow the config order
+            if max_workers > 1:
+                schedule = sorted(to_run, key=estimated_cost, reverse=True)
+            else:
+                schedule = to_run
+            schedule = iter(schedule)
+            summary_writer = csv.writer(summary_fh, lineterminator='\n')
         
-        if csv_lines:
-            append_csv_rows(csv_lines)
-            successful += 1
-        else:
-            failed += 1
+            # Experiments are submitted as slots free up, so an interrupted run
+            # leaves nothing queued behind the ones in flight
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            in_flight = {executor.submit(process_experiment, e)
+                         for e in itertools.islice(schedule, max_workers)}
         
-        print("---")
+            # Rows are batched and written together; the finally block makes sure
+            # buffered rows still reach summary.csv if the run is interrupted
+            pending_rows = []
+            try:
+                while in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        # Results are collected on the main thread, so summary appends never race
+                        csv_rows = future.result()
+                    
+                        if csv_rows:
+                            pending_rows.extend(csv_rows)
+                            if len(pending_rows) >= CSV_FLUSH_EVERY:
+                                append_csv_rows(summary_fh, summary_writer, pending_rows)
+                                pending_rows.clear()
+                            successful += 1
+                        else:
+                            failed += 1
+                    
+                        print("---")
+                        next_experiment = next(schedule, None)
+                        if next_experiment is not None:
+                            in_flight.add(executor.submit(process_experiment, next_experiment))
+            except KeyboardInterrupt:
+                # Ctrl-C has already stopped the running freqtrade commands; keep
+                # the experiments still in flight from starting another hyperopt
+                hyperopt_lock.closed = True
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                append_csv_rows(summary_fh, summary_writer, pending_rows)
+            executor.shutdown()
+    finally:
+        if started_container:
+            subprocess.run(["docker-compose", "stop", "freqtrade"])
     
     # Summary
     print(f"\n🎉 Orchestrator completed!")
     print(f"✅ Successful: {successful}")
     print(f"❌ Failed: {failed}")
+    if args.resume:
+        print(f"⏭️  Skipped: {skipped}")
     print(f"📊 Results saved to: {SUMMARY_CSV}")
     
     if failed > 0:
@@ -1,17 +1,108 @@
 import os
+import re
 import sys
+import glob
+import shutil
 import subprocess
 import datetime
+import time
 import argparse
+import tempfile
+import threading
+import traceback
+import unittest
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
+from unittest import mock
 
-def run_experiment(strategy, pair, timeframe, start_date_str, is_length, oos_length, epochs, spaces, loss_function="SharpeHyperOptLoss", exp_index=1, verbose=False):
-    # Convert lengths to integers
-    is_length = int(is_length)
-    oos_length = int(oos_length)
-    epochs = int(epochs)
+from generate_report import generate_report_for, format_csv_row
 
-    # Calculate IS and OOS periods
+def _cp_glob(pattern, dest):
+    """Copy files matching a shell-style pattern into dest (dotfiles excluded, as in the shell)"""
+    for path in glob.glob(pattern):
+        shutil.copy2(path, dest)
+
+# Freqtrade command prefixes: a throwaway compose container per command, or
+# `docker exec` into the already running compose `freqtrade` container
+FREQTRADE_RUN = ["docker-compose", "run", "--rm", "freqtrade"]
+FREQTRADE_EXEC = ["docker", "exec", "freqtrade", "freqtrade"]
+DOCKER_EXEC = FREQTRADE_EXEC[:-1]
+
+def _exec_with_pid_file(cmd, pid_file):
+    """Wrap a FREQTRADE_EXEC command so it writes its container PID to pid_file"""
+    n = len(DOCKER_EXEC)
+    return cmd[:n] + ["sh", "-c", 'echo $$ > "$0" && exec "$@"', pid_file.as_posix()] + cmd[n:]
+
+def _kill_in_container(pid_file):
+    """Stop the container process recorded by _exec_with_pid_file"""
+    try:
+        pid = pid_file.read_text().strip()
+    except OSError:
+        return
+    subprocess.run(DOCKER_EXEC + ["sh", "-c", 'kill -TERM "$0"', pid], capture_output=True)
+
+# Output markers that flag a failed hyperopt run
+HYPEROPT_STDOUT_FAILURES = ("No good result found",)
+HYPEROPT_STDERR_FAILURES = ("AttributeError", "Exception", "Error")
+# Each stream is checked with one compiled alternation instead of a scan per marker
+HYPEROPT_STDOUT_FAILURE_RE = re.compile("|".join(map(re.escape, HYPEROPT_STDOUT_FAILURES)))
+HYPEROPT_STDERR_FAILURE_RE = re.compile("|".join(map(re.escape, HYPEROPT_STDERR_FAILURES)))
+
+def _stream_command(cmd, log_fh, echo, timeout=None, stdout_failure_re=None, stderr_failure_re=None,
+                    on_timeout=None):
+    """Run cmd, writing its stdout to log_fh line by line as it is produced.
+
+    stderr is spooled to a temporary file and logged after stdout, so memory
+    stays flat however verbose the command is. Returns the exit code and
+    whether stdout/stderr matched their failure patterns. Raises
+    subprocess.TimeoutExpired if the command runs longer than timeout seconds;
+    on_timeout is called before the process is killed, to stop work the
+    process only proxies (e.g. a command run with docker exec).
+    """
+    stdout_failed = False
+    stderr_failed = False
+    with tempfile.TemporaryFile('w+') as stderr_spool:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_spool, text=True, bufsize=1)
+
+        timed_out = threading.Event()
+        watchdog = None
+        if timeout is not None:
+            def kill_on_timeout():
+                timed_out.set()
+                if on_timeout is not None:
+                    on_timeout()
+                process.kill()
+            watchdog = threading.Timer(timeout, kill_on_timeout)
+            watchdog.start()
+
+        try:
+            for line in process.stdout:
+                log_fh.write(line)
+                if echo:
+                    sys.stdout.write(line)
+                if stdout_failure_re is not None and not stdout_failed:
+                    stdout_failed = stdout_failure_re.search(line) is not None
+            returncode = process.wait()
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout)
+
+        stderr_spool.seek(0)
+        for line in stderr_spool:
+            log_fh.write(line)
+            if echo:
+                sys.stdout.write(line)
+            if stderr_failure_re is not None and not stderr_failed:
+                stderr_failed = stderr_failure_re.search(line) is not None
+
+    return returncode, stdout_failed, stderr_failed
+
+@lru_cache(maxsize=None)
+def _compute_periods(start_date_str, is_length, oos_length):
+    """In-sample and out-of-sample --timerange strings; sweeps repeat the same windows"""
     start_date = datetime.datetime.strptime(start_date_str, '%Y%m%d').date()
 
     is_end_date = start_date + datetime.timedelta(days=is_length - 1)
@@ -21,6 +112,38 @@ def run_experiment(strategy, pair, timeframe, start_date_str, is_length, oos_len
     oos_end_date = oos_start_date + datetime.timedelta(days=oos_length - 1)
     oos_period = f'{oos_start_date.strftime("%Y%m%d")}-{oos_end_date.strftime("%Y%m%d")}'
 
+    return is_period, oos_period
+
+def run_experiment(strategy, pair, timeframe, start_date_str, is_length, oos_length, epochs, spaces, loss_function="SharpeHyperOptLoss", exp_index=1, verbose=False, hyperopt_jobs=-1, quiet=False, timeout=None, docker_exec=False, hyperopt_lock=None):
+    """Run hyperopt + OOS backtest for one experiment.
+
+    Returns the summary row (a list in CSV_HEADERS order, None if the report
+    failed) and the experiment's output directory.
+
+    quiet keeps progress messages out of stdout (they still go to run.log).
+    timeout bounds the total time spent in freqtrade commands, in seconds;
+    subprocess.TimeoutExpired is raised when it runs out. Time spent waiting
+    for hyperopt_lock does not count.
+    docker_exec runs freqtrade inside the running `freqtrade` container
+    instead of starting a new compose container for every command.
+    hyperopt_lock, if given, is held while hyperopt runs: freqtrade allows one
+    hyperopt at a time and a second one quietly exits with code 0.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    def remaining_time():
+        return None if deadline is None else max(0, deadline - time.monotonic())
+
+    freqtrade = FREQTRADE_EXEC if docker_exec else FREQTRADE_RUN
+
+    # Convert lengths to integers
+    is_length = int(is_length)
+    oos_length = int(oos_length)
+    epochs = int(epochs)
+
+    # Calculate IS and OOS periods
+    is_period, oos_period = _compute_periods(start_date_str, is_length, oos_length)
+
     # Create a unique directory for the experiment
     timestamp = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
     exp_dir = Path(f"experiments/outputs/{exp_index}.{strategy}/{pair.replace('/', '-')}/{timeframe}/{timestamp}")
@@ -29,134 +152,205 @@ def run_experiment(strategy, pair, timeframe, start_date_str, is_length, oos_len
     # Define the log file
     log_file = exp_dir / "run.log"
 
-    def log_and_print(message):
-        with open(log_file, 'a') as f:
-            f.write(message + '\n')
-        print(message)
-
-    log_and_print(f"Strategy: {strategy}")
-    log_and_print(f"Pair: {pair}")
-    log_and_print(f"Timeframe: {timeframe}")
-    log_and_print(f"Start Date: {start_date_str}")
-    log_and_print(f"IS Length (days): {is_length}")
-    log_and_print(f"OOS Length (days): {oos_length}")
-    log_and_print(f"Epochs: {epochs}")
-    log_and_print(f"Spaces: {spaces}")
-    log_and_print(f"Loss Function: {loss_function}")
-    log_and_print(f"Calculated In Sample Period: {is_period}")
-    log_and_print(f"Calculated Out of Sample Period: {oos_period}")
-
-    # Clean previous backtest results to ensure we only copy files from this experiment
-    subprocess.run(["rm", "-f", "user_data/backtest_results/*.json"], capture_output=True)
-    subprocess.run(["rm", "-f", "user_data/backtest_results/*.zip"], capture_output=True)
-
-    # Clean strategy JSON files
-    subprocess.run(["rm", "-f", f"user_data/strategies/{strategy}.json"], capture_output=True)
-
-    # Parse spaces parameter and add stoploss by default
-    spaces_list = spaces.split(',') + ['stoploss']
-    spaces_args = ['--spaces'] + spaces_list
-    
-    # Hyperopt for the specified strategy
-    hyperopt_cmd = [
-        "docker-compose", "run", "--rm", "freqtrade", "hyperopt",
-        "--config", "user_data/config.json",
-        "--strategy", strategy,
-        "--hyperopt-loss", loss_function
-    ] + spaces_args + [
-        "--epochs", str(epochs),
-        "--pair", pair,
-        "--timeframe", timeframe,
-        "--timerange", is_period,
-        "-j", "-1"
-    ]
-    log_and_print(f"Running command: {' '.join(hyperopt_cmd)}")
-    if verbose:
-        print(f"[HYPEROPT] {' '.join(hyperopt_cmd)}")
-    result = subprocess.run(hyperopt_cmd, capture_output=True, text=True)
-    log_and_print(result.stdout)
-    log_and_print(result.stderr)
+    # Private backtest export directory, so concurrent experiments never see each
+    # other's results. It lives under user_data so the container can write to it.
+    export_name = exp_dir.relative_to("experiments/outputs").as_posix().replace('/', '_')
+    export_dir = Path("user_data/backtest_results/experiments") / export_name
+
+    # Parameters hyperopt exports for the strategy; removed before and after the run
+    strategy_json = Path(f"user_data/strategies/{strategy}.json")
+
+    try:
+        # Keep run.log open for the whole experiment instead of reopening it per message
+        with open(log_file, 'a', buffering=1 << 16) as log_fh:
+            def log_and_print(message):
+                log_fh.write(message + '\n')
+                if not quiet:
+                    print(message)
+
+            log_and_print(f"Strategy: {strategy}")
+            log_and_print(f"Pair: {pair}")
+            log_and_print(f"Timeframe: {timeframe}")
+            log_and_print(f"Start Date: {start_date_str}")
+            log_and_print(f"IS Length (days): {is_length}")
+            log_and_print(f"OOS Length (days): {oos_length}")
+            log_and_print(f"Epochs: {epochs}")
+            log_and_print(f"Spaces: {spaces}")
+            log_and_print(f"Loss Function: {loss_function}")
+            log_and_print(f"Calculated In Sample Period: {is_period}")
+            log_and_print(f"Calculated Out of Sample Period: {oos_period}")
+
+            # Killing the local docker client on timeout leaves a docker exec command
+            # running in the container, so those commands record their PID for the kill
+            pid_file = export_dir / "freqtrade.pid"
+
+            def run_freqtrade(cmd, stdout_failure_re=None, stderr_failure_re=None):
+                if docker_exec:
+                    return _stream_command(
+                        _exec_with_pid_file(cmd, pid_file), log_fh, not quiet, remaining_time(),
+                        stdout_failure_re, stderr_failure_re, lambda: _kill_in_container(pid_file)
+                    )
+                return _stream_command(cmd, log_fh, not quiet, remaining_time(),
+                                       stdout_failure_re, stderr_failure_re)
+
+            # Start from an empty export directory so we only copy files from this experiment
+            shutil.rmtree(export_dir, ignore_errors=True)
+            export_dir.mkdir(parents=True)
+
+            # Clean strategy JSON files
+            strategy_json.unlink(missing_ok=True)
+
+            # Parse spaces parameter and add stoploss by default
+            spaces_list = spaces.split(',') + ['stoploss']
+            spaces_args = ['--spaces'] + spaces_list
     
-    # Check if hyperopt failed
-    hyperopt_failed = (
-        "No good result found" in result.stdout or 
-        result.returncode != 0 or 
-        "AttributeError" in result.stderr or
-        "Exception" in result.stderr or
-        "Error" in result.stderr
-    )
-    if hyperopt_failed:
-        if "No good result found" in result.stdout:
-            failure_reason = "Hyperopt produced no good results"
-        else:
-            failure_reason = "Hyperopt crashed with error"
-        log_and_print(f"WARNING: Hyperopt failed for {strategy} - {failure_reason}")
-        # Create status file to indicate failure
-        with open(exp_dir / "hyperopt_status.txt", 'w') as f:
-            f.write(f"{strategy}:{failure_reason}\n")
-    else:
-        log_and_print(f"SUCCESS: Hyperopt completed for {strategy}")
-        # Create status file to indicate success
-        with open(exp_dir / "hyperopt_status.txt", 'w') as f:
-            f.write(f"{strategy}:Success\n")
-
-    # Only run OOS backtest if hyperopt succeeded
-    if not hyperopt_failed:
-        # Backtesting for OOS
-        backtest_cmd = [
-            "docker-compose", "run", "--rm", "freqtrade", "backtesting",
-            "--config", "user_data/config.json",
-            "--strategy", strategy,
-            "--pair", pair,
-            "--timeframe", timeframe,
-            "--timerange", oos_period,
-            "--export", "trades"
-        ]
-        log_and_print(f"Running command: {' '.join(backtest_cmd)}")
-        if verbose:
-            print(f"[BACKTEST] {' '.join(backtest_cmd)}")
-        result = subprocess.run(backtest_cmd, capture_output=True, text=True)
-        log_and_print(result.stdout)
-        log_and_print(result.stderr)
-    else:
-        log_and_print(f"SKIPPING: OOS backtest for {strategy} due to hyperopt failure")
-
-    # Copy backtest results (JSON and ZIP files)
-    subprocess.run(["cp", "-f", "user_data/backtest_results/*.json", str(exp_dir)], capture_output=True)
-    subprocess.run(["cp", "-f", "user_data/backtest_results/*.zip", str(exp_dir)], capture_output=True)
+            # Hyperopt for the specified strategy
+            hyperopt_cmd = freqtrade + [
+                "hyperopt",
+                "--config", "user_data/config.json",
+                "--strategy", strategy,
+                "--hyperopt-loss", loss_function
+            ] + spaces_args + [
+                "--epochs", str(epochs),
+                "--pair", pair,
+                "--timeframe", timeframe,
+                "--timerange", is_period,
+                "-j", str(hyperopt_jobs)
+            ]
+            log_and_print(f"Running command: {' '.join(hyperopt_cmd)}")
+            if verbose:
+                print(f"[HYPEROPT] {' '.join(hyperopt_cmd)}")
+            lock_requested = time.monotonic()
+            with hyperopt_lock or nullcontext():
+                if deadline is not None:
+                    deadline += time.monotonic() - lock_requested
+                returncode, no_good_result, stderr_failed = run_freqtrade(
+                    hyperopt_cmd, HYPEROPT_STDOUT_FAILURE_RE, HYPEROPT_STDERR_FAILURE_RE
+                )
     
-    # Copy optimization parameter files before they get deleted
-    strategy_json = f"user_data/strategies/{strategy}.json"
+            # Check if hyperopt failed; a run that exported no parameters would leave
+            # the OOS backtest on the strategy's defaults
+            hyperopt_failed = (no_good_result or returncode != 0 or stderr_failed
+                               or not strategy_json.exists())
+            if hyperopt_failed:
+                if no_good_result:
+                    failure_reason = "Hyperopt produced no good results"
+                elif returncode != 0 or stderr_failed:
+                    failure_reason = "Hyperopt crashed with error"
+                else:
+                    failure_reason = f"Hyperopt exported no {strategy}.json"
+                log_and_print(f"WARNING: Hyperopt failed for {strategy} - {failure_reason}")
+                # Create status file to indicate failure
+                with open(exp_dir / "hyperopt_status.txt", 'w') as f:
+                    f.write(f"{strategy}:{failure_reason}\n")
+            else:
+                log_and_print(f"SUCCESS: Hyperopt completed for {strategy}")
+                # Create status file to indicate success
+                with open(exp_dir / "hyperopt_status.txt", 'w') as f:
+                    f.write(f"{strategy}:Success\n")
+
+            # Only run OOS backtest if hyperopt succeeded
+            if not hyperopt_failed:
+                # Backtesting for OOS
+                backtest_cmd = freqtrade + [
+                    "backtesting",
+                    "--config", "user_data/config.json",
+                    "--strategy", strategy,
+                    "--pair", pair,
+                    "--timeframe", timeframe,
+                    "--timerange", oos_period,
+                    "--export", "trades",
+                    "--export-filename", export_dir.as_posix()
+                ]
+                log_and_print(f"Running command: {' '.join(backtest_cmd)}")
+                if verbose:
+                    print(f"[BACKTEST] {' '.join(backtest_cmd)}")
+                run_freqtrade(backtest_cmd)
+            else:
+                log_and_print(f"SKIPPING: OOS backtest for {strategy} due to hyperopt failure")
+
+            # Copy backtest results (JSON and ZIP files)
+            _cp_glob(f"{export_dir}/*.json", exp_dir)
+            _cp_glob(f"{export_dir}/*.zip", exp_dir)
     
-    if os.path.exists(strategy_json):
-        subprocess.run(["cp", strategy_json, str(exp_dir)], capture_output=True)
-        log_and_print(f"Saved optimization parameters: {strategy}.json")
-    else:
-        log_and_print(f"Warning: {strategy}.json not found for parameter capture")
-
-    # Run the python reporting script and capture its output to the log file, then output CSV data
-    generate_report_cmd = [
-        sys.executable,  # Use sys.executable to ensure the correct python interpreter
-        "experiments/scripts/generate_report.py",
-        str(exp_dir),
-        strategy,
-        str(exp_index)
-    ]
-    log_and_print(f"Running command: {' '.join(generate_report_cmd)}")
-    result = subprocess.run(generate_report_cmd, capture_output=True, text=True)
-    # Log to file only, don't print stdout to avoid duplicates
-    with open(log_file, 'a') as f:
-        f.write(result.stdout + '\n')
-        f.write(result.stderr + '\n')
-    # Print CSV output ONLY to stdout for run_all_experiments.py
-    print(result.stdout, end='')
-
-    log_and_print(f"Experiment finished for {strategy} {pair} {timeframe}")
-
-    # Clean strategy JSON files again
-    subprocess.run(["rm", "-f", f"user_data/strategies/{strategy}.json"], capture_output=True)
+            # Copy optimization parameter files before they get deleted
+            if strategy_json.exists():
+                shutil.copy2(strategy_json, exp_dir)
+                log_and_print(f"Saved optimization parameters: {strategy}.json")
+            else:
+                log_and_print(f"Warning: {strategy}.json not found for parameter capture")
+
+            # Generate the report in-process and log the CSV row to the log file
+            log_and_print(f"Generating report: {exp_dir} {strategy} {exp_index}")
+            log_fh.flush()  # The report embeds run.log, so it must be complete on disk
+            try:
+                summary_row = generate_report_for(exp_dir, strategy, exp_index)
+                log_fh.write(format_csv_row(summary_row))
+            except Exception:
+                summary_row = None
+                log_fh.write(traceback.format_exc())
+            # Logged to file only; the row is returned to the caller
+            log_fh.write('\n')
+
+            log_and_print(f"Experiment finished for {strategy} {pair} {timeframe}")
+    finally:
+        # Clean strategy JSON files and the export directory again, also when a
+        # timeout or error ends the experiment early
+        strategy_json.unlink(missing_ok=True)
+        shutil.rmtree(export_dir, ignore_errors=True)
+
+    return summary_row, exp_dir
+
+class TestRunExperiment(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        Path("user_data/strategies").mkdir(parents=True)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_hyperopt_lock_wait_not_timed(self):
+        timeouts = []
+
+        def fake_stream_command(cmd, log_fh, echo, timeout=None, *args, **kwargs):
+            timeouts.append(timeout)
+            if "hyperopt" in cmd:
+                Path("user_data/strategies/TestStrategy.json").write_text("{}")
+            return 0, False, False
+
+        lock = threading.Lock()
+        lock.acquire()
+        threading.Timer(0.5, lock.release).start()
+        with mock.patch(f"{__name__}._stream_command", fake_stream_command), \
+                mock.patch(f"{__name__}.generate_report_for", return_value=["1"]):
+            summary_row, _ = run_experiment("TestStrategy", "BTC/USDT", "5m", "20240101", 10, 5, 10, "buy",
+                                            quiet=True, timeout=0.2, hyperopt_lock=lock)
+        self.assertEqual(summary_row, ["1"])
+        # The hyperopt and the backtest both get (nearly) the whole timeout
+        self.assertEqual(len(timeouts), 2)
+        self.assertGreater(min(timeouts), 0.1)
+
+    def test_cleanup_after_timeout(self):
+        def fake_stream_command(cmd, *args, **kwargs):
+            Path("user_data/strategies/TestStrategy.json").write_text("{}")
+            raise subprocess.TimeoutExpired(cmd, 0.2)
+
+        with mock.patch(f"{__name__}._stream_command", fake_stream_command):
+            with self.assertRaises(subprocess.TimeoutExpired):
+                run_experiment("TestStrategy", "BTC/USDT", "5m", "20240101", 10, 5, 10, "buy",
+                               quiet=True, timeout=0.2)
+        self.assertFalse(Path("user_data/strategies/TestStrategy.json").exists())
+        self.assertEqual(list(Path("user_data/backtest_results/experiments").iterdir()), [])
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        suite = unittest.TestLoader().loadTestsFromTestCase(TestRunExperiment)
+        result = unittest.TextTestRunner().run(suite)
+        sys.exit(0 if result.wasSuccessful() else 1)
+
     parser = argparse.ArgumentParser(description="Run a freqtrade experiment")
     parser.add_argument("strategy", help="Strategy name")
     parser.add_argument("pair", help="Trading pair")
@@ -169,10 +363,15 @@ if __name__ == "__main__":
     parser.add_argument("loss_function", nargs="?", default="SharpeHyperOptLoss", help="Hyperopt loss function")
     parser.add_argument("exp_index", nargs="?", default="1", help="Experiment index number")
     parser.add_argument("--verbose", action="store_true", help="Print full freqtrade commands")
+    parser.add_argument("--hyperopt-jobs", type=int, default=-1, help="Parallel hyperopt workers (-1 uses all cores)")
+    parser.add_argument("--docker-exec", action="store_true", help="Run freqtrade in the running freqtrade container")
     
     args = parser.parse_args()
     
-    run_experiment(
+    summary_row, _ = run_experiment(
         args.strategy, args.pair, args.timeframe, args.start_date,
-        args.is_length, args.oos_length, args.epochs, args.spaces, args.loss_function, int(args.exp_index), args.verbose
-    )
\ No newline at end of file
+        args.is_length, args.oos_length, args.epochs, args.spaces, args.loss_function, int(args.exp_index), args.verbose,
+        args.hyperopt_jobs, docker_exec=args.docker_exec
+    )
+    # Print CSV output to stdout for callers scraping the script's output
+    print(format_csv_row(summary_row) if summary_row else "", end='')
\ No newline at end of file
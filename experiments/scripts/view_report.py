@@ -8,15 +8,28 @@ from pathlib import Path
 
 def find_latest_report():
     """Find the most recent HTML report"""
-    outputs_dir = Path("experiments/outputs")
-    reports = list(outputs_dir.glob("**/report.html"))
-    if not reports:
+    # Walk the outputs tree with os.scandir: DirEntry caches the file type,
+    # so only report.html files need a stat() call
+    latest = None
+    latest_mtime = -1
+    stack = ["experiments/outputs"]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name == "report.html":
+                    mtime = entry.stat().st_mtime
+                    if mtime > latest_mtime:
+                        latest, latest_mtime = entry.path, mtime
+    if latest is None:
         print("No HTML reports found")
         return None
-    
-    # Sort by modification time, newest first
-    reports.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-    return reports[0]
+    return Path(latest)
 
 def main():
     if len(sys.argv) > 1:
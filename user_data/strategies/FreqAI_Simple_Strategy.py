@@ -4,9 +4,8 @@ from typing import Dict, List
 
 import numpy as np
 import pandas as pd
-import talib.abstract as ta
+import talib
 from pandas import DataFrame
-from technical import qtpylib
 
 from freqtrade.strategy import (
     IStrategy,
@@ -19,6 +18,12 @@ from freqtrade.strategy import (
 
 logger = logging.getLogger(__name__)
 
+# QFL indicators of the higher timeframe, keyed by pair, timeframe, last candle,
+# length and volume MA period. The higher timeframe only gains a candle every
+# few base candles, so most populate_indicators calls reuse the previous result.
+_QFL_CACHE: Dict[tuple, DataFrame] = {}
+_QFL_CACHE_SIZE = 128
+
 
 class FreqAI_Simple_Strategy(IStrategy):
     """
@@ -68,6 +73,16 @@ class FreqAI_Simple_Strategy(IStrategy):
     max_base_age = IntParameter(0, 50, default=0, space='buy')  # 0 = disabled
     allow_consecutive_signals = True
 
+    # Scale-free features stored as float32 to halve their memory traffic.
+    # Price and volume levels stay float64 since they are compared against close,
+    # as do rsi and qfl_buy_strength, which feed the entry thresholds.
+    float32_features = (
+        'macd', 'macdsignal', 'macdhist', 'bb_percent', 'adx',
+        'price_change', 'high_low_ratio', 'close_open_ratio',
+        'qfl_fractal_down_pct_diff', 'qfl_fractal_up_pct_diff', 'qfl_fractal_distance_ratio',
+        'qfl_sell_strength',
+    )
+
     def informative_pairs(self):
         """
         Define additional, informative pair/interval combinations to be cached from the exchange.
@@ -85,50 +100,60 @@ class FreqAI_Simple_Strategy(IStrategy):
         Populate indicators that will be used by FreqAI for feature engineering
         """
         # === BASIC TECHNICAL INDICATORS ===
+        # TA-Lib functions are called directly on the OHLCV arrays, extracted once
+        open_ = dataframe['open'].to_numpy(dtype=np.float64)
+        high = dataframe['high'].to_numpy(dtype=np.float64)
+        low = dataframe['low'].to_numpy(dtype=np.float64)
+        close = dataframe['close'].to_numpy(dtype=np.float64)
+        volume = dataframe['volume'].to_numpy(dtype=np.float64)
+        
         # RSI
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
+        dataframe['rsi'] = talib.RSI(close, timeperiod=14)
         
         # MACD
-        macd = ta.MACD(dataframe)
-        dataframe['macd'] = macd['macd']
-        dataframe['macdsignal'] = macd['macdsignal']
-        dataframe['macdhist'] = macd['macdhist']
-        
-        # Bollinger Bands
-        bollinger = qtpylib.bollinger_bands(qtpylib.typical_price(dataframe), window=20, stds=2)
-        dataframe['bb_lowerband'] = bollinger['lower']
-        dataframe['bb_middleband'] = bollinger['mid']
-        dataframe['bb_upperband'] = bollinger['upper']
+        macd, macdsignal, macdhist = talib.MACD(close)
+        dataframe['macd'] = macd
+        dataframe['macdsignal'] = macdsignal
+        dataframe['macdhist'] = macdhist
+        
+        # Bollinger Bands on the typical price (20 bars, 2 stds, partial windows at the start)
+        typical_price = pd.Series((high + low + close) / 3.0, index=dataframe.index)
+        bb_window = typical_price.rolling(window=20, min_periods=1)
+        bb_mid = bb_window.mean()
+        bb_std = bb_window.std()
+        dataframe['bb_lowerband'] = bb_mid - 2 * bb_std
+        dataframe['bb_middleband'] = bb_mid
+        dataframe['bb_upperband'] = bb_mid + 2 * bb_std
         dataframe['bb_percent'] = (dataframe['close'] - dataframe['bb_lowerband']) / (dataframe['bb_upperband'] - dataframe['bb_lowerband'])
         
         # EMA
-        dataframe['ema_fast'] = ta.EMA(dataframe, timeperiod=12)
-        dataframe['ema_slow'] = ta.EMA(dataframe, timeperiod=26)
+        dataframe['ema_fast'] = talib.EMA(close, timeperiod=12)
+        dataframe['ema_slow'] = talib.EMA(close, timeperiod=26)
         
         # SMA
-        dataframe['sma_short'] = ta.SMA(dataframe, timeperiod=10)
-        dataframe['sma_long'] = ta.SMA(dataframe, timeperiod=30)
+        dataframe['sma_short'] = talib.SMA(close, timeperiod=10)
+        dataframe['sma_long'] = talib.SMA(close, timeperiod=30)
         
         # ATR
-        dataframe['atr'] = ta.ATR(dataframe, timeperiod=14)
+        dataframe['atr'] = talib.ATR(high, low, close, timeperiod=14)
         
         # ADX
-        dataframe['adx'] = ta.ADX(dataframe, timeperiod=14)
+        dataframe['adx'] = talib.ADX(high, low, close, timeperiod=14)
         
         # Volume indicators
-        dataframe['volume_sma'] = ta.SMA(dataframe['volume'], timeperiod=20)
+        dataframe['volume_sma'] = talib.SMA(volume, timeperiod=20)
         
         # Price action features
         dataframe['price_change'] = dataframe['close'].pct_change()
         dataframe['high_low_ratio'] = dataframe['high'] / dataframe['low']
-        dataframe['close_open_ratio'] = dataframe['close'] / dataframe['open']
+        dataframe['close_open_ratio'] = close / open_
         
         # Volatility
         dataframe['volatility'] = dataframe['close'].rolling(window=20).std()
 
         # === QFL INDICATORS ===
         # Volume moving average for QFL
-        dataframe['volume_ma'] = ta.SMA(dataframe['volume'], timeperiod=self.volume_ma_period.value)
+        dataframe['volume_ma'] = talib.SMA(volume, timeperiod=self.volume_ma_period.value)
         
         # Get QFL indicators from higher timeframe or calculate directly
         if self.qfl_timeframe == self.timeframe:
@@ -146,65 +171,89 @@ class FreqAI_Simple_Strategy(IStrategy):
                 )
                 
                 if not qfl_tf_data.empty:
-                    # Calculate QFL indicators on higher timeframe
-                    qfl_tf_data = self.calculate_qfl_indicators(qfl_tf_data)
+                    # Calculate QFL indicators on higher timeframe, reusing the
+                    # cached result while no new higher timeframe candle has closed
+                    cache_key = (
+                        metadata['pair'],
+                        self.qfl_timeframe,
+                        qfl_tf_data['date'].iloc[-1],
+                        len(qfl_tf_data),
+                        self.volume_ma_period.value,
+                    )
+                    qfl_indicators = _QFL_CACHE.get(cache_key)
+                    if qfl_indicators is None:
+                        # Only the QFL outputs are merged, which keeps the merge narrow
+                        qfl_indicators = self.calculate_qfl_indicators(qfl_tf_data)[
+                            ['date', 'fractal_up', 'fractal_down', 'base_age']
+                        ]
+                        if len(_QFL_CACHE) >= _QFL_CACHE_SIZE:
+                            _QFL_CACHE.pop(next(iter(_QFL_CACHE)))
+                        _QFL_CACHE[cache_key] = qfl_indicators
                     
-                    # Merge with current timeframe
+                    # Merge with current timeframe (merge_informative_pair renames
+                    # the informative columns in place, so hand it a copy)
                     dataframe = merge_informative_pair(
                         dataframe, 
-                        qfl_tf_data, 
+                        qfl_indicators.copy(), 
                         self.timeframe, 
                         self.qfl_timeframe, 
                         ffill=True
                     )
                     
-                    # Rename columns for easier access
-                    dataframe['qfl_fractal_up'] = dataframe[f'fractal_up_{self.qfl_timeframe}']
-                    dataframe['qfl_fractal_down'] = dataframe[f'fractal_down_{self.qfl_timeframe}']
-                    dataframe['qfl_base_age'] = dataframe[f'base_age_{self.qfl_timeframe}']
-                    
-                    # Clean up temporary columns
-                    cols_to_drop = [col for col in dataframe.columns if col.endswith(f'_{self.qfl_timeframe}')]
-                    dataframe.drop(columns=cols_to_drop, inplace=True)
+                    # Rename columns for easier access and drop the informative date
+                    dataframe.rename(columns={
+                        f'fractal_up_{self.qfl_timeframe}': 'qfl_fractal_up',
+                        f'fractal_down_{self.qfl_timeframe}': 'qfl_fractal_down',
+                        f'base_age_{self.qfl_timeframe}': 'qfl_base_age',
+                    }, inplace=True)
+                    del dataframe[f'date_{self.qfl_timeframe}']
 
         # === FREQAI QFL FEATURES ===
         # Fill NaN values for calculations
-        dataframe['qfl_fractal_down'] = dataframe['qfl_fractal_down'].fillna(method='ffill')
-        dataframe['qfl_fractal_up'] = dataframe['qfl_fractal_up'].fillna(method='ffill')
+        fractal_cols = ['qfl_fractal_down', 'qfl_fractal_up']
+        dataframe[fractal_cols] = dataframe[fractal_cols].ffill()
         dataframe['qfl_base_age'] = dataframe['qfl_base_age'].fillna(0)
+        
+        # Derived features are computed on arrays; bars without a fractal yet get the fill value
+        close = dataframe['close'].to_numpy()
+        fractal_down = dataframe['qfl_fractal_down'].to_numpy()
+        fractal_up = dataframe['qfl_fractal_up'].to_numpy()
+        no_down = np.isnan(fractal_down)
+        no_up = np.isnan(fractal_up)
 
         # 1. Value of qfl_fractal_down (already available)
         # 2. Difference in percentage between qfl_fractal_down and the price
-        dataframe['qfl_fractal_down_pct_diff'] = (
-            (dataframe['close'] - dataframe['qfl_fractal_down']) / 
-            dataframe['qfl_fractal_down'] * 100
-        ).fillna(0)
+        dataframe['qfl_fractal_down_pct_diff'] = np.where(
+            no_down, 0.0, (close - fractal_down) / fractal_down * 100
+        )
         
         # 3. Age of the base (qfl_base_age) - already available
         
         # Additional QFL-derived features for FreqAI
-        dataframe['qfl_fractal_up_pct_diff'] = (
-            (dataframe['close'] - dataframe['qfl_fractal_up']) / 
-            dataframe['qfl_fractal_up'] * 100
-        ).fillna(0)
+        dataframe['qfl_fractal_up_pct_diff'] = np.where(
+            no_up, 0.0, (close - fractal_up) / fractal_up * 100
+        )
         
         # Distance ratios
-        dataframe['qfl_fractal_distance_ratio'] = (
-            dataframe['qfl_fractal_down'] / dataframe['qfl_fractal_up']
-        ).fillna(1)
+        dataframe['qfl_fractal_distance_ratio'] = np.where(
+            no_down | no_up, 1.0, fractal_down / fractal_up
+        )
         
-        # QFL buy/sell thresholds for features
-        dataframe['qfl_buy_threshold'] = 100 - self.buy_percentage.value
-        dataframe['qfl_sell_threshold'] = 100 + self.sell_percentage.value
+        # QFL buy/sell thresholds (scalars, not broadcast into columns)
+        qfl_buy_threshold = 100 - self.buy_percentage.value
+        qfl_sell_threshold = 100 + self.sell_percentage.value
         
         # QFL signal strength (how close to trigger)
-        dataframe['qfl_buy_strength'] = (
-            dataframe['qfl_buy_threshold'] - (100 * dataframe['close'] / dataframe['qfl_fractal_down'])
-        ).fillna(0)
+        dataframe['qfl_buy_strength'] = np.where(
+            no_down, 0.0, qfl_buy_threshold - 100 * close / fractal_down
+        )
+        
+        dataframe['qfl_sell_strength'] = np.where(
+            no_up, 0.0, 100 * close / fractal_up - qfl_sell_threshold
+        )
         
-        dataframe['qfl_sell_strength'] = (
-            (100 * dataframe['close'] / dataframe['qfl_fractal_up']) - dataframe['qfl_sell_threshold']
-        ).fillna(0)
+        features = list(self.float32_features)
+        dataframe[features] = dataframe[features].astype(np.float32)
         
         return dataframe
 
@@ -212,52 +261,59 @@ class FreqAI_Simple_Strategy(IStrategy):
         """
         Calculate QFL fractals and bases - adapted from QFL_Strategy.py
         """
-        # Volume moving average for fractal validation
-        dataframe['volume_ma'] = ta.SMA(dataframe['volume'], timeperiod=self.volume_ma_period.value)
+        # Volume moving average for fractal validation; populate_indicators has
+        # already added it when QFL runs on the base timeframe
+        if 'volume_ma' not in dataframe.columns:
+            dataframe['volume_ma'] = talib.SMA(dataframe['volume'].to_numpy(dtype=np.float64),
+                                               timeperiod=self.volume_ma_period.value)
+        
+        # Fractal detection on the raw arrays: slices stand in for shift(k), and
+        # the first 5 bars (which would compare against NaN) stay False
+        high = dataframe['high'].to_numpy()
+        low = dataframe['low'].to_numpy()
+        volume_confirmed = dataframe['volume'].to_numpy() > dataframe['volume_ma'].to_numpy()
+        fractal_up_condition = np.zeros(len(dataframe), dtype=bool)
+        fractal_down_condition = np.zeros(len(dataframe), dtype=bool)
         
-        # Fractal detection
         # Up fractal: high[3]>high[4] and high[4]>high[5] and high[2]<high[3] and high[1]<high[2] and volume[3]>vam[3]
-        dataframe['fractal_up_condition'] = (
-            (dataframe['high'].shift(3) > dataframe['high'].shift(4)) &
-            (dataframe['high'].shift(4) > dataframe['high'].shift(5)) &
-            (dataframe['high'].shift(2) < dataframe['high'].shift(3)) &
-            (dataframe['high'].shift(1) < dataframe['high'].shift(2)) &
-            (dataframe['volume'].shift(3) > dataframe['volume_ma'].shift(3))
+        fractal_up_condition[5:] = (
+            (high[2:-3] > high[1:-4]) &
+            (high[1:-4] > high[:-5]) &
+            (high[3:-2] < high[2:-3]) &
+            (high[4:-1] < high[3:-2]) &
+            volume_confirmed[2:-3]
         )
         
         # Down fractal: low[3]<low[4] and low[4]<low[5] and low[2]>low[3] and low[1]>low[2] and volume[3]>vam[3]
-        dataframe['fractal_down_condition'] = (
-            (dataframe['low'].shift(3) < dataframe['low'].shift(4)) &
-            (dataframe['low'].shift(4) < dataframe['low'].shift(5)) &
-            (dataframe['low'].shift(2) > dataframe['low'].shift(3)) &
-            (dataframe['low'].shift(1) > dataframe['low'].shift(2)) &
-            (dataframe['volume'].shift(3) > dataframe['volume_ma'].shift(3))
+        fractal_down_condition[5:] = (
+            (low[2:-3] < low[1:-4]) &
+            (low[1:-4] < low[:-5]) &
+            (low[3:-2] > low[2:-3]) &
+            (low[4:-1] > low[3:-2]) &
+            volume_confirmed[2:-3]
         )
-        
-        # Track fractal levels
-        dataframe['fractal_up'] = np.nan
-        dataframe['fractal_down'] = np.nan
-        
-        # Set fractal levels when conditions are met
-        dataframe.loc[dataframe['fractal_up_condition'], 'fractal_up'] = dataframe['high'].shift(3)
-        dataframe.loc[dataframe['fractal_down_condition'], 'fractal_down'] = dataframe['low'].shift(3)
-        
-        # Forward fill fractal levels
-        dataframe['fractal_up'] = dataframe['fractal_up'].ffill()
-        dataframe['fractal_down'] = dataframe['fractal_down'].ffill()
-        
-        # Calculate base age
-        dataframe['base_changed'] = dataframe['fractal_down'] != dataframe['fractal_down'].shift(1)
-        dataframe['base_age'] = 0
-        
-        # Calculate bars since base change
-        base_change_indices = dataframe[dataframe['base_changed']].index
-        for i, idx in enumerate(dataframe.index):
-            if len(base_change_indices) > 0:
-                recent_changes = base_change_indices[base_change_indices <= idx]
-                if len(recent_changes) > 0:
-                    last_change = recent_changes[-1]
-                    dataframe.loc[idx, 'base_age'] = idx - last_change
+        dataframe['fractal_up_condition'] = fractal_up_condition
+        dataframe['fractal_down_condition'] = fractal_down_condition
+        
+        # Fractal levels are the high/low 3 bars back, forward filled
+        fractal_up = np.full(len(dataframe), np.nan)
+        fractal_down = np.full(len(dataframe), np.nan)
+        up_idx = np.flatnonzero(fractal_up_condition)
+        down_idx = np.flatnonzero(fractal_down_condition)
+        fractal_up[up_idx] = high[up_idx - 3]
+        fractal_down[down_idx] = low[down_idx - 3]
+        dataframe['fractal_up'] = pd.Series(fractal_up, index=dataframe.index).ffill()
+        dataframe['fractal_down'] = pd.Series(fractal_down, index=dataframe.index).ffill()
+        
+        # Calculate base age; NaN != NaN, so bars before the first base count as changes
+        base_level = dataframe['fractal_down'].to_numpy()
+        base_changed = np.ones(len(base_level), dtype=bool)
+        base_changed[1:] = base_level[1:] != base_level[:-1]
+        
+        # Calculate bars since base change: carry the position of the last change forward
+        positions = np.arange(len(dataframe))
+        last_change = np.maximum.accumulate(np.where(base_changed, positions, -1))
+        dataframe['base_age'] = np.where(last_change >= 0, positions - last_change, 0)
         
         return dataframe
 
@@ -265,64 +321,57 @@ class FreqAI_Simple_Strategy(IStrategy):
         """
         Combined QFL + FreqAI entry logic
         """
-        conditions = []
-        
         # === QFL CONDITIONS ===
-        # Age condition for QFL base
-        qfl_age_condition = (
-            (self.max_base_age.value == 0) | 
-            (df['qfl_base_age'] < self.max_base_age.value)
-        )
+        # Conditions are plain bool arrays collected in lists and combined with
+        # np.logical_and/or.reduce; FreqAI columns are only read when present
+        close = df['close'].to_numpy()
+        volume = df['volume'].to_numpy()
+        fractal_down = df['qfl_fractal_down'].to_numpy()
         
         # QFL buy condition: price falls X% below down fractal
-        df['price_pct_below_fractal'] = 100 * (df['close'] / df['qfl_fractal_down'])
-        df['buy_threshold'] = 100 - self.buy_percentage.value
-        
-        qfl_buy_condition = (
-            (df['price_pct_below_fractal'] < df['buy_threshold']) &
-            qfl_age_condition &
-            (df['qfl_fractal_down'].notna()) &
-            (df['volume'] > 0)
-        )
+        price_pct_of_fractal = 100 * (close / fractal_down)
+        buy_threshold = 100 - self.buy_percentage.value
         
-        # === FREQAI CONDITIONS ===
-        freqai_bullish = False
-        if '&-s_close' in df.columns and 'do_predict' in df.columns:
-            freqai_bullish = (
-                (df['&-s_close'] > df['close']) &  # FreqAI predicts price will go up
-                (df['do_predict'] == 1)  # Only when FreqAI is active
-            )
-        
-        # === TECHNICAL CONDITIONS ===
-        # Basic RSI condition
-        rsi_condition = True
-        if self.buy_rsi_enabled.value:
-            rsi_condition = df['rsi'] < self.buy_rsi.value
+        qfl_buy_masks = [
+            price_pct_of_fractal < buy_threshold,
+            ~np.isnan(fractal_down),
+            volume > 0,
+        ]
+        
+        # Age condition for QFL base
+        if self.max_base_age.value != 0:
+            qfl_buy_masks.append(df['qfl_base_age'].to_numpy() < self.max_base_age.value)
+        
+        qfl_buy_condition = np.logical_and.reduce(qfl_buy_masks)
+        
+        # Without FreqAI predictions the QFL signal is the entry
+        has_freqai = '&-s_close' in df.columns and 'do_predict' in df.columns
+        if not has_freqai:
+            df.loc[qfl_buy_condition, 'enter_long'] = 1
+            return df
         
-        # Volume condition
-        volume_condition = df['volume'] > df['volume_sma']
+        # === FREQAI CONDITIONS ===
+        freqai_bullish = np.logical_and(
+            df['&-s_close'].to_numpy() > close,  # FreqAI predicts price will go up
+            df['do_predict'].to_numpy() == 1  # Only when FreqAI is active
+        )
         
         # === COMBINED ENTRY LOGIC ===
         # Option 1: QFL + FreqAI confirmation
-        qfl_freqai_entry = qfl_buy_condition
-        if isinstance(freqai_bullish, pd.Series):
-            qfl_freqai_entry = qfl_freqai_entry & freqai_bullish
+        qfl_freqai_entry = np.logical_and(qfl_buy_condition, freqai_bullish)
         
         # Option 2: Strong FreqAI signal even without QFL
-        strong_freqai_entry = False
-        if isinstance(freqai_bullish, pd.Series):
-            strong_freqai_entry = (
-                freqai_bullish & 
-                rsi_condition & 
-                volume_condition &
-                (df['qfl_buy_strength'] > -2.0)  # Not too far from QFL level
-            )
+        strong_freqai_masks = [
+            freqai_bullish,
+            volume > df['volume_sma'].to_numpy(),  # Volume condition
+            df['qfl_buy_strength'].to_numpy() > -2.0,  # Not too far from QFL level
+        ]
+        if self.buy_rsi_enabled.value:
+            strong_freqai_masks.append(df['rsi'].to_numpy() < self.buy_rsi.value)
+        strong_freqai_entry = np.logical_and.reduce(strong_freqai_masks)
         
         # Final entry condition
-        final_entry = qfl_freqai_entry
-        if isinstance(strong_freqai_entry, pd.Series):
-            final_entry = final_entry | strong_freqai_entry
-        
+        final_entry = np.logical_or(qfl_freqai_entry, strong_freqai_entry)
         df.loc[final_entry, 'enter_long'] = 1
         
         return df
@@ -331,36 +380,30 @@ class FreqAI_Simple_Strategy(IStrategy):
         """
         Combined QFL + FreqAI exit logic
         """
+        close = df['close'].to_numpy()
+        fractal_up = df['qfl_fractal_up'].to_numpy()
+        
         # === QFL EXIT CONDITIONS ===
         # QFL exit: price rises X% above up fractal
-        qfl_exit_condition = (
-            (100 * (df['close'] / df['qfl_fractal_up']) > (100 + self.sell_percentage.value)) &
-            (df['qfl_fractal_up'].notna())
+        qfl_exit_condition = np.logical_and(
+            100 * (close / fractal_up) > (100 + self.sell_percentage.value),
+            ~np.isnan(fractal_up)
         )
         
-        # === FREQAI EXIT CONDITIONS ===
-        freqai_bearish = False
-        if '&-s_close' in df.columns and 'do_predict' in df.columns:
-            freqai_bearish = (
-                (df['&-s_close'] < df['close']) &  # FreqAI predicts price will go down
-                (df['do_predict'] == 1)  # Only when FreqAI is active
-            )
-        
-        # === TECHNICAL EXIT CONDITIONS ===
-        # RSI overbought condition
-        rsi_exit = False
-        if self.sell_rsi_enabled.value:
-            rsi_exit = df['rsi'] > self.sell_rsi.value
-        
-        # === COMBINED EXIT LOGIC ===
         # Option 1: QFL exit signal
-        final_exit = qfl_exit_condition
-        
-        # Option 2: Strong FreqAI bearish + RSI overbought
-        if isinstance(freqai_bearish, pd.Series):
-            strong_freqai_exit = freqai_bearish & rsi_exit if rsi_exit is not False else freqai_bearish
-            final_exit = final_exit | strong_freqai_exit
+        if '&-s_close' not in df.columns or 'do_predict' not in df.columns:
+            df.loc[qfl_exit_condition, 'exit_long'] = 1
+            return df
+        
+        # Option 2: Strong FreqAI bearish, confirmed by RSI overbought when enabled
+        strong_freqai_masks = [
+            df['&-s_close'].to_numpy() < close,  # FreqAI predicts price will go down
+            df['do_predict'].to_numpy() == 1,  # Only when FreqAI is active
+        ]
+        if self.sell_rsi_enabled.value:
+            strong_freqai_masks.append(df['rsi'].to_numpy() > self.sell_rsi.value)
         
+        final_exit = np.logical_or(qfl_exit_condition, np.logical_and.reduce(strong_freqai_masks))
         df.loc[final_exit, 'exit_long'] = 1
         
         return df
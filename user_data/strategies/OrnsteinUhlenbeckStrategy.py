@@ -6,6 +6,8 @@ import numpy as np
 from pandas import DataFrame
 from freqtrade.strategy import IStrategy, DecimalParameter, IntParameter
 
+import _ou_kernels
+
 class OrnsteinUhlenbeckStrategy(IStrategy):
     """
     Ornstein-Uhlenbeck Mean Reversion Strategy (Long Only)
@@ -61,28 +63,33 @@ class OrnsteinUhlenbeckStrategy(IStrategy):
     def estimate_ou_parameters(self, log_prices: pd.Series, lookback: int):
         """
         Estimate Ornstein-Uhlenbeck parameters (θ, μ, σ) using a rolling window.
+
+        Each bar uses the `lookback` bars before it; the rolling statistics are
+        computed in one vectorized pass instead of a per-bar loop, or by the
+        ou_rolling numba kernel when numba is installed.
         """
-        # This calculation is iterative and can be slow; consider vectorizing for performance
-        ou_params = []
-        for i in range(lookback, len(log_prices)):
-            window = log_prices[i-lookback:i]
-            if len(window) < 2:
-                ou_params.append((np.nan, np.nan, np.nan))
-                continue
-            
-            delta_t = 1
-            mu = window.mean()
-            
-            try:
-                autocorr = window.autocorr(lag=1)
-                theta = -np.log(autocorr) / delta_t if autocorr > 0 else np.nan
-            except Exception:
-                theta = np.nan
+        x = log_prices.to_numpy(dtype=np.float64)
+        if _ou_kernels.NUMBA_AVAILABLE and not np.isnan(x).any():
+            theta, mu, sigma = _ou_kernels.ou_rolling(x, lookback)
+            ou_params = pd.DataFrame({'theta': theta, 'mu': mu, 'sigma': sigma}, index=log_prices.index)
+            return ou_params.iloc[lookback:]
 
-            sigma = window.std() * np.sqrt(2 * theta / delta_t) if pd.notna(theta) and theta > 0 else np.nan
-            ou_params.append((theta, mu, sigma))
-        
-        return pd.DataFrame(ou_params, columns=['theta', 'mu', 'sigma'], index=log_prices.index[lookback:])
+        delta_t = 1
+        # Windows end on the previous bar. Shifting by the first price keeps the
+        # rolling sums small without changing the correlation or the spread
+        previous = log_prices.shift(1)
+        centered = previous - log_prices.iloc[0]
+
+        mu = previous.rolling(lookback).mean()
+        std = centered.rolling(lookback).std()
+        # Lag-1 autocorrelation over the lookback-1 consecutive pairs in the window
+        autocorr = centered.rolling(lookback - 1).corr(centered.shift(1))
+
+        theta = -np.log(autocorr.where(autocorr > 0)) / delta_t
+        sigma = std * np.sqrt(2 * theta.where(theta > 0) / delta_t)
+
+        ou_params = pd.DataFrame({'theta': theta, 'mu': mu, 'sigma': sigma})
+        return ou_params.iloc[lookback:]
 
     def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         """
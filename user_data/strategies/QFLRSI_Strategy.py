@@ -1,12 +1,29 @@
 # pragma pylint: disable=missing-docstring, invalid-name, too-few-public-methods
 # pragma pylint: disable=too-many-instance-attributes, too-many-arguments, too-many-locals
 
+from typing import Dict
+
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from pandas import DataFrame
-from freqtrade.strategy import IStrategy, DecimalParameter, IntParameter, CategoricalParameter, merge_informative_pair
+from freqtrade.strategy import IStrategy, DecimalParameter, IntParameter, CategoricalParameter
+from freqtrade.exchange import timeframe_to_minutes
 import talib.abstract as ta
 
+import _qfl_core
+
+# Entry inputs keyed by pair, timeframe, entry settings, the indicator periods
+# they were computed with and the candles they were built from. Kept at module
+# level like the QFL cache so the hyperopt epochs a worker process runs share them.
+_ENTRY_ARRAYS_CACHE: Dict[tuple, tuple] = {}
+_ENTRY_ARRAYS_CACHE_SIZE = 128
+
+# Sorted rolling RSI windows keyed by pair, timeframe, RSI settings and candles.
+# Each entry holds candles x rsi_lookback floats, so only a few are kept.
+_SORTED_RSI_CACHE: Dict[tuple, np.ndarray] = {}
+_SORTED_RSI_CACHE_SIZE = 8
+
 
 class QFLRSI_Strategy(IStrategy):
     """
@@ -111,24 +128,38 @@ class QFLRSI_Strategy(IStrategy):
         # RSI calculation on current timeframe
         dataframe['rsi'] = ta.RSI(dataframe['close'], timeperiod=self.rsi_length)
         
-        # ATR calculation (always calculate for plotting purposes)
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=self.atr_period.value)
+        # ATR calculation (also calculated for plotting when percentage entries are used)
+        if self.use_atr_entry or self.plot_indicators_enabled():
+            dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=self.atr_period.value)
         
         # Calculate RSI Percentile Rank (PNR) with 150 candle lookback
-        dataframe['rsi_pnr'] = dataframe['rsi'].rolling(window=self.rsi_lookback, min_periods=self.rsi_lookback).apply(
-            lambda x: (x.iloc[-1] <= x).sum() / len(x) * 100, raw=False
-        )
+        # Every window is compared against its last value at once on a strided view;
+        # windows that still contain the RSI warm-up NaNs stay NaN as with rolling().
+        # The rank is a multiple of 100/lookback that no signal compares, so float32 is enough.
+        rsi = dataframe['rsi'].to_numpy(dtype=np.float64)
+        rsi_pnr = np.full(len(rsi), np.nan, dtype=np.float32)
+        if len(rsi) >= self.rsi_lookback:
+            windows = sliding_window_view(rsi, self.rsi_lookback)
+            pnr = (windows[:, -1:] <= windows).sum(axis=1) / self.rsi_lookback * 100
+            pnr[np.isnan(windows).any(axis=1)] = np.nan
+            rsi_pnr[self.rsi_lookback - 1:] = pnr
+        dataframe['rsi_pnr'] = rsi_pnr
         
         # Calculate dynamic percentile levels based on parameters
-        dataframe['rsi_entry_level'] = dataframe['rsi'].rolling(window=self.rsi_lookback, min_periods=self.rsi_lookback).quantile(self.rsi_entry_percentile.value / 100)
-        dataframe['rsi_exit_level'] = dataframe['rsi'].rolling(window=self.rsi_lookback, min_periods=self.rsi_lookback).quantile(self.rsi_exit_percentile.value / 100)
+        # The sorted RSI windows only depend on the candles, so they are built once
+        # per pair and every hyperopt epoch just reads its quantiles from them
+        sorted_windows = self.sorted_rsi_windows(dataframe, metadata, rsi)
+        dataframe['rsi_entry_level'] = self.rsi_quantile_level(sorted_windows, self.rsi_entry_percentile.value / 100, len(rsi))
+        dataframe['rsi_exit_level'] = self.rsi_quantile_level(sorted_windows, self.rsi_exit_percentile.value / 100, len(rsi))
         
         # Individual condition indicators will be set in entry logic
         
         # Since we're running 1h chart with 1h QFL timeframe, calculate directly on current timeframe
         if self.qfl_timeframe == self.timeframe:
             # Calculate QFL indicators on current timeframe
-            dataframe = self.calculate_qfl_indicators(dataframe)
+            qfl_indicators = _qfl_core.cached_qfl_indicators(dataframe, metadata['pair'], self.timeframe, self.volume_ma_period.value)
+            for col in _qfl_core.QFL_COLUMNS:
+                dataframe[col] = qfl_indicators[col]
             dataframe['qfl_fractal_up'] = dataframe['fractal_up']
             dataframe['qfl_fractal_down'] = dataframe['fractal_down']
             dataframe['qfl_base_age'] = dataframe['base_age']
@@ -142,25 +173,21 @@ class QFLRSI_Strategy(IStrategy):
                 
                 if not qfl_tf_data.empty:
                     # Calculate QFL indicators on higher timeframe
-                    qfl_tf_data = self.calculate_qfl_indicators(qfl_tf_data)
-                    
-                    # Merge with current timeframe
-                    dataframe = merge_informative_pair(
-                        dataframe, 
-                        qfl_tf_data, 
-                        self.timeframe, 
-                        self.qfl_timeframe, 
-                        ffill=True
-                    )
+                    qfl_indicators = _qfl_core.cached_qfl_indicators(qfl_tf_data, metadata['pair'], self.qfl_timeframe,
+                                                           self.volume_ma_period.value)
                     
-                    # Rename columns for easier access
-                    dataframe['qfl_fractal_up'] = dataframe[f'fractal_up_{self.qfl_timeframe}']
-                    dataframe['qfl_fractal_down'] = dataframe[f'fractal_down_{self.qfl_timeframe}']
-                    dataframe['qfl_base_age'] = dataframe[f'base_age_{self.qfl_timeframe}']
+                    # Align each higher timeframe candle with the base candle at which it
+                    # closes, as merge_informative_pair does, and carry it forward. Only the
+                    # three QFL columns are written, so no suffixed columns need dropping.
+                    offset = timeframe_to_minutes(self.qfl_timeframe) - timeframe_to_minutes(self.timeframe)
+                    close_dates = pd.Index(qfl_indicators['date'] + pd.Timedelta(minutes=offset))
+                    positions = np.maximum.accumulate(close_dates.get_indexer(dataframe['date']))
+                    merged = positions >= 0
                     
-                    # Clean up temporary columns
-                    cols_to_drop = [col for col in dataframe.columns if col.endswith(f'_{self.qfl_timeframe}')]
-                    dataframe.drop(columns=cols_to_drop, inplace=True)
+                    # Store as qfl_* columns for easier access
+                    for column in ('fractal_up', 'fractal_down', 'base_age'):
+                        values = qfl_indicators[column].to_numpy()[positions]
+                        dataframe[f'qfl_{column}'] = np.where(merged, values, np.nan)
         
         # Debug logging (disabled)
         # print(f"DEBUG: QFL timeframe: {self.qfl_timeframe}, Strategy timeframe: {self.timeframe}")
@@ -171,106 +198,123 @@ class QFLRSI_Strategy(IStrategy):
         
         return dataframe
     
-    def calculate_qfl_indicators(self, dataframe: DataFrame) -> DataFrame:
+    def plot_indicators_enabled(self) -> bool:
         """
-        Calculate QFL fractals and bases on higher timeframe data
-        Translates the Pine Script QFL logic to Python
+        Plot-only indicators are skipped in backtesting and hyperopt
         """
-        # Volume moving average for fractal validation
-        dataframe['volume_ma'] = ta.SMA(dataframe['volume'], timeperiod=self.volume_ma_period.value)
-        
-        # Fractal detection (Pine: up/down conditions)
-        # Up fractal: high[3]>high[4] and high[4]>high[5] and high[2]<high[3] and high[1]<high[2] and volume[3]>vam[3]
-        dataframe['fractal_up_condition'] = (
-            (dataframe['high'].shift(3) > dataframe['high'].shift(4)) &
-            (dataframe['high'].shift(4) > dataframe['high'].shift(5)) &
-            (dataframe['high'].shift(2) < dataframe['high'].shift(3)) &
-            (dataframe['high'].shift(1) < dataframe['high'].shift(2)) &
-            (dataframe['volume'].shift(3) > dataframe['volume_ma'].shift(3))
-        )
-        
-        # Down fractal: low[3]<low[4] and low[4]<low[5] and low[2]>low[3] and low[1]>low[2] and volume[3]>vam[3]
-        dataframe['fractal_down_condition'] = (
-            (dataframe['low'].shift(3) < dataframe['low'].shift(4)) &
-            (dataframe['low'].shift(4) < dataframe['low'].shift(5)) &
-            (dataframe['low'].shift(2) > dataframe['low'].shift(3)) &
-            (dataframe['low'].shift(1) > dataframe['low'].shift(2)) &
-            (dataframe['volume'].shift(3) > dataframe['volume_ma'].shift(3))
-        )
+        return not (self.dp and self.dp.runmode.value in ('backtest', 'hyperopt'))
+    
+    def entry_arrays(self, dataframe: DataFrame, metadata: dict) -> tuple:
+        """
+        Entry inputs from build_entry_arrays, reused from the cache while the
+        candles, atr_period and volume_ma_period are unchanged
+        """
+        cache_key = (metadata['pair'], self.timeframe, self.use_atr_entry, self.max_base_age,
+                     self.atr_period.value, self.volume_ma_period.value,
+                     len(dataframe), dataframe['date'].iloc[0], dataframe['date'].iloc[-1])
+        entry_arrays = _ENTRY_ARRAYS_CACHE.get(cache_key)
+        if entry_arrays is None:
+            entry_arrays = self.build_entry_arrays(dataframe)
+            if len(_ENTRY_ARRAYS_CACHE) >= _ENTRY_ARRAYS_CACHE_SIZE:
+                _ENTRY_ARRAYS_CACHE.pop(next(iter(_ENTRY_ARRAYS_CACHE)))
+            _ENTRY_ARRAYS_CACHE[cache_key] = entry_arrays
+        return entry_arrays
+    
+    def build_entry_arrays(self, dataframe: DataFrame) -> tuple:
+        """
+        Entry inputs that only change with the candles, atr_period (atr) and
+        volume_ma_period (fractal_down).
+        Returns (close, fractal_down, atr, valid) where valid combines the
+        fractal/ATR NaN checks, the volume check and the base age condition.
+        """
+        close = dataframe['close'].to_numpy()
+        fractal_down = dataframe['qfl_fractal_down'].to_numpy()
+        valid_masks = [
+            ~np.isnan(fractal_down),
+            dataframe['volume'].to_numpy() > 0,
+        ]
         
-        # Track fractal levels (Pine: fractalupF() and fractaldownF() functions)
-        dataframe['fractal_up'] = np.nan
-        dataframe['fractal_down'] = np.nan
+        # Age condition (Pine: agecond = maxbaseage == 0 or age < maxbaseage)
+        if self.max_base_age != 0:
+            valid_masks.append(dataframe['qfl_base_age'].to_numpy() < self.max_base_age)
         
-        # Set fractal levels when conditions are met
-        dataframe.loc[dataframe['fractal_up_condition'], 'fractal_up'] = dataframe['high'].shift(3)
-        dataframe.loc[dataframe['fractal_down_condition'], 'fractal_down'] = dataframe['low'].shift(3)
+        atr = None
+        if self.use_atr_entry:
+            atr = dataframe['atr'].to_numpy()
+            valid_masks.append(~np.isnan(atr))
         
-        # Forward fill fractal levels (Pine: fd := down ? low[3] : nz(fd[1]))
-        dataframe['fractal_up'] = dataframe['fractal_up'].ffill()
-        dataframe['fractal_down'] = dataframe['fractal_down'].ffill()
+        return close, fractal_down, atr, np.logical_and.reduce(valid_masks)
+    
+    def sorted_rsi_windows(self, dataframe: DataFrame, metadata: dict, rsi: np.ndarray):
+        """
+        Sorted rolling RSI windows (one row per window), reused from the cache
+        while the candles are unchanged.
+        Returns None when there are fewer candles than the lookback.
+        """
+        if len(rsi) < self.rsi_lookback:
+            return None
         
-        # Calculate base age (Pine: barssince(fuptf != fuptf[1]))
-        dataframe['base_changed'] = dataframe['fractal_down'] != dataframe['fractal_down'].shift(1)
-        dataframe['base_age'] = 0
+        cache_key = (metadata['pair'], self.timeframe, self.rsi_length, self.rsi_lookback,
+                     len(dataframe), dataframe['date'].iloc[0], dataframe['date'].iloc[-1])
+        sorted_windows = _SORTED_RSI_CACHE.get(cache_key)
+        if sorted_windows is None:
+            # NaNs sort last, so windows still in the RSI warm-up end with NaN
+            sorted_windows = np.sort(sliding_window_view(rsi, self.rsi_lookback), axis=1)
+            if len(_SORTED_RSI_CACHE) >= _SORTED_RSI_CACHE_SIZE:
+                _SORTED_RSI_CACHE.pop(next(iter(_SORTED_RSI_CACHE)))
+            _SORTED_RSI_CACHE[cache_key] = sorted_windows
+        return sorted_windows
+    
+    def rsi_quantile_level(self, sorted_windows, quantile: float, length: int) -> np.ndarray:
+        """
+        Rolling RSI quantile with linear interpolation, matching rolling().quantile()
+        """
+        level = np.full(length, np.nan)
+        if sorted_windows is None:
+            return level
         
-        # Calculate bars since base change
-        base_change_indices = dataframe[dataframe['base_changed']].index
-        for i, idx in enumerate(dataframe.index):
-            if len(base_change_indices) > 0:
-                # Find most recent base change
-                recent_changes = base_change_indices[base_change_indices <= idx]
-                if len(recent_changes) > 0:
-                    last_change = recent_changes[-1]
-                    dataframe.loc[idx, 'base_age'] = idx - last_change
+        position = quantile * (self.rsi_lookback - 1)
+        lower = int(position)
+        values = sorted_windows[:, lower]
+        if position != lower:
+            values = values + (sorted_windows[:, lower + 1] - values) * (position - lower)
         
-        return dataframe
+        level[self.rsi_lookback - 1:] = np.where(np.isnan(sorted_windows[:, -1]), np.nan, values)
+        return level
     
     def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         """
         QFL Entry Logic
         Pine: buy = 100*(close/fdowntf) < 100 - percentage and agecond
         """
-        # Age condition (Pine: agecond = maxbaseage == 0 or age < maxbaseage)
-        age_condition = (
-            (self.max_base_age == 0) | 
-            (dataframe['qfl_base_age'] < self.max_base_age)
-        )
+        # The price arrays and the conditions that do not involve atr_multiplier
+        # (fractal/ATR NaN checks, volume, base age) are built once per candle set
+        # and indicator periods, so each epoch only evaluates the entry threshold
+        close, fractal_down, atr, valid = self.entry_arrays(dataframe, metadata)
         
         # QFL entry condition: ATR-based or percentage-based
         if self.use_atr_entry:
             # ATR-based entry: price below fractal by X ATRs
-            dataframe['atr_entry_threshold'] = dataframe['qfl_fractal_down'] - (dataframe['atr'] * self.atr_multiplier.value)
-            qfl_buy_condition = (
-                (dataframe['close'] < dataframe['atr_entry_threshold']) &
-                age_condition &
-                (dataframe['qfl_fractal_down'].notna()) &
-                (dataframe['atr'].notna()) &
-                (dataframe['volume'] > 0)
-            )
+            atr_entry_threshold = fractal_down - atr * self.atr_multiplier.value
+            qfl_buy_condition = valid & (close < atr_entry_threshold)
+            if self.plot_indicators_enabled():
+                dataframe['atr_entry_threshold'] = atr_entry_threshold
         else:
             # Percentage-based entry: price below fractal by X%
-            dataframe['price_pct_below_fractal'] = 100 * (dataframe['close'] / dataframe['qfl_fractal_down'])
-            dataframe['buy_threshold'] = 100 - self.buy_percentage
-            qfl_buy_condition = (
-                (dataframe['price_pct_below_fractal'] < dataframe['buy_threshold']) &
-                age_condition &
-                (dataframe['qfl_fractal_down'].notna()) &
-                (dataframe['volume'] > 0)
-            )
+            price_pct_below_fractal = 100 * (close / fractal_down)
+            qfl_buy_condition = valid & (price_pct_below_fractal < 100 - self.buy_percentage)
             # Still calculate ATR threshold for plotting comparison
-            if 'atr' in dataframe.columns:
+            if self.plot_indicators_enabled():
                 dataframe['atr_entry_threshold'] = dataframe['qfl_fractal_down'] - (dataframe['atr'] * self.atr_multiplier.value)
-            else:
-                dataframe['atr_entry_threshold'] = np.nan
         
         # RSI condition: RSI below its percentile level (oversold)
-        rsi_buy_condition = dataframe['rsi'] < dataframe['rsi_entry_level']
+        rsi_buy_condition = dataframe['rsi'].to_numpy() < dataframe['rsi_entry_level'].to_numpy()
         
         # Set individual condition indicators for plotting
-        # Use NaN for false conditions and a visible value for true conditions
-        dataframe['qfl_condition'] = np.where(qfl_buy_condition, 1.0, np.nan)
-        dataframe['rsi_condition'] = np.where(rsi_buy_condition, 1.0, np.nan)
+        # Use NaN for false conditions and a visible value for true conditions (float32 markers)
+        if self.plot_indicators_enabled():
+            dataframe['qfl_condition'] = np.where(qfl_buy_condition, np.float32(1.0), np.float32(np.nan))
+            dataframe['rsi_condition'] = np.where(rsi_buy_condition, np.float32(1.0), np.float32(np.nan))
         
         # Combined buy condition
         buy_condition = qfl_buy_condition & rsi_buy_condition
@@ -279,11 +323,12 @@ class QFLRSI_Strategy(IStrategy):
         # Handle consecutive signals like Pine Script
         if not self.allow_consecutive_signals:
             # Only trigger if not triggered on previous bar OR fractal changed
-            fractal_changed = dataframe['qfl_fractal_down'] != dataframe['qfl_fractal_down'].shift(1)
-            buy_condition = buy_condition & (
-                (~buy_condition.shift(1).fillna(False)) | 
-                fractal_changed
-            )
+            # (the first bar and NaN-to-NaN bars count as changed, like != shift(1))
+            fractal_changed = np.ones(len(fractal_down), dtype=bool)
+            fractal_changed[1:] = fractal_down[1:] != fractal_down[:-1]
+            previous_buy = np.zeros(len(buy_condition), dtype=bool)
+            previous_buy[1:] = buy_condition[:-1]
+            buy_condition = buy_condition & (~previous_buy | fractal_changed)
         
         # Debug logging - show individual condition counts (disabled)
         # qfl_signals = dataframe[qfl_buy_condition]
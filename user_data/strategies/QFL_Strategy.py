@@ -166,17 +166,11 @@ class QFL_Strategy(IStrategy):
         
         # Calculate base age (Pine: barssince(fuptf != fuptf[1]))
         dataframe['base_changed'] = dataframe['fractal_down'] != dataframe['fractal_down'].shift(1)
-        dataframe['base_age'] = 0
         
-        # Calculate bars since base change
-        base_change_indices = dataframe[dataframe['base_changed']].index
-        for i, idx in enumerate(dataframe.index):
-            if len(base_change_indices) > 0:
-                # Find most recent base change
-                recent_changes = base_change_indices[base_change_indices <= idx]
-                if len(recent_changes) > 0:
-                    last_change = recent_changes[-1]
-                    dataframe.loc[idx, 'base_age'] = idx - last_change
+        # Calculate bars since base change: carry the position of the last change forward
+        positions = np.arange(len(dataframe))
+        last_change = np.maximum.accumulate(np.where(dataframe['base_changed'].to_numpy(), positions, -1))
+        dataframe['base_age'] = np.where(last_change >= 0, positions - last_change, 0)
         
         return dataframe
     
@@ -4,9 +4,12 @@
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
-from freqtrade.strategy import IStrategy, DecimalParameter, IntParameter, merge_informative_pair
+from freqtrade.strategy import IStrategy, DecimalParameter, IntParameter
+from freqtrade.exchange import timeframe_to_minutes
 import talib.abstract as ta
 
+import _qfl_core
+
 
 class QFL_Strategy_SLTP(IStrategy):
     """
@@ -81,7 +84,9 @@ class QFL_Strategy_SLTP(IStrategy):
         # Since we're running 1h chart with 1h QFL timeframe, calculate directly on current timeframe
         if self.qfl_timeframe == self.timeframe:
             # Calculate QFL indicators on current timeframe
-            dataframe = self.calculate_qfl_indicators(dataframe)
+            qfl_indicators = _qfl_core.cached_qfl_indicators(dataframe, metadata['pair'], self.timeframe, self.volume_ma_period)
+            for col in _qfl_core.QFL_COLUMNS:
+                dataframe[col] = qfl_indicators[col]
             dataframe['qfl_fractal_up'] = dataframe['fractal_up']
             dataframe['qfl_fractal_down'] = dataframe['fractal_down']
             dataframe['qfl_base_age'] = dataframe['base_age']
@@ -95,87 +100,21 @@ class QFL_Strategy_SLTP(IStrategy):
                 
                 if not qfl_tf_data.empty:
                     # Calculate QFL indicators on higher timeframe
-                    qfl_tf_data = self.calculate_qfl_indicators(qfl_tf_data)
-                    
-                    # Merge with current timeframe
-                    dataframe = merge_informative_pair(
-                        dataframe, 
-                        qfl_tf_data, 
-                        self.timeframe, 
-                        self.qfl_timeframe, 
-                        ffill=True
-                    )
+                    qfl_indicators = _qfl_core.cached_qfl_indicators(qfl_tf_data, metadata['pair'], self.qfl_timeframe,
+                                                           self.volume_ma_period)
                     
-                    # Rename columns for easier access
-                    dataframe['qfl_fractal_up'] = dataframe[f'fractal_up_{self.qfl_timeframe}']
-                    dataframe['qfl_fractal_down'] = dataframe[f'fractal_down_{self.qfl_timeframe}']
-                    dataframe['qfl_base_age'] = dataframe[f'base_age_{self.qfl_timeframe}']
+                    # Align each higher timeframe candle with the base candle at which it
+                    # closes, as merge_informative_pair does, and carry it forward. Only the
+                    # three QFL columns are written, so no suffixed columns need dropping.
+                    offset = timeframe_to_minutes(self.qfl_timeframe) - timeframe_to_minutes(self.timeframe)
+                    close_dates = pd.Index(qfl_indicators['date'] + pd.Timedelta(minutes=offset))
+                    positions = np.maximum.accumulate(close_dates.get_indexer(dataframe['date']))
+                    merged = positions >= 0
                     
-                    # Clean up temporary columns
-                    cols_to_drop = [col for col in dataframe.columns if col.endswith(f'_{self.qfl_timeframe}')]
-                    dataframe.drop(columns=cols_to_drop, inplace=True)
-        
-        # Debug logging
-        print(f"DEBUG: QFL timeframe: {self.qfl_timeframe}, Strategy timeframe: {self.timeframe}")
-        print(f"DEBUG: Fractal up count: {dataframe['qfl_fractal_up'].notna().sum()}")
-        print(f"DEBUG: Fractal down count: {dataframe['qfl_fractal_down'].notna().sum()}")
-        if not dataframe['qfl_fractal_down'].isna().all():
-            print(f"DEBUG: Latest fractal down: {dataframe['qfl_fractal_down'].iloc[-1]}")
-        
-        return dataframe
-    
-    def calculate_qfl_indicators(self, dataframe: DataFrame) -> DataFrame:
-        """
-        Calculate QFL fractals and bases on higher timeframe data
-        Translates the Pine Script QFL logic to Python
-        """
-        # Volume moving average for fractal validation
-        dataframe['volume_ma'] = ta.SMA(dataframe['volume'], timeperiod=self.volume_ma_period)
-        
-        # Fractal detection (Pine: up/down conditions)
-        # Up fractal: high[3]>high[4] and high[4]>high[5] and high[2]<high[3] and high[1]<high[2] and volume[3]>vam[3]
-        dataframe['fractal_up_condition'] = (
-            (dataframe['high'].shift(3) > dataframe['high'].shift(4)) &
-            (dataframe['high'].shift(4) > dataframe['high'].shift(5)) &
-            (dataframe['high'].shift(2) < dataframe['high'].shift(3)) &
-            (dataframe['high'].shift(1) < dataframe['high'].shift(2)) &
-            (dataframe['volume'].shift(3) > dataframe['volume_ma'].shift(3))
-        )
-        
-        # Down fractal: low[3]<low[4] and low[4]<low[5] and low[2]>low[3] and low[1]>low[2] and volume[3]>vam[3]
-        dataframe['fractal_down_condition'] = (
-            (dataframe['low'].shift(3) < dataframe['low'].shift(4)) &
-            (dataframe['low'].shift(4) < dataframe['low'].shift(5)) &
-            (dataframe['low'].shift(2) > dataframe['low'].shift(3)) &
-            (dataframe['low'].shift(1) > dataframe['low'].shift(2)) &
-            (dataframe['volume'].shift(3) > dataframe['volume_ma'].shift(3))
-        )
-        
-        # Track fractal levels (Pine: fractalupF() and fractaldownF() functions)
-        dataframe['fractal_up'] = np.nan
-        dataframe['fractal_down'] = np.nan
-        
-        # Set fractal levels when conditions are met
-        dataframe.loc[dataframe['fractal_up_condition'], 'fractal_up'] = dataframe['high'].shift(3)
-        dataframe.loc[dataframe['fractal_down_condition'], 'fractal_down'] = dataframe['low'].shift(3)
-        
-        # Forward fill fractal levels (Pine: fd := down ? low[3] : nz(fd[1]))
-        dataframe['fractal_up'] = dataframe['fractal_up'].ffill()
-        dataframe['fractal_down'] = dataframe['fractal_down'].ffill()
-        
-        # Calculate base age (Pine: barssince(fuptf != fuptf[1]))
-        dataframe['base_changed'] = dataframe['fractal_down'] != dataframe['fractal_down'].shift(1)
-        dataframe['base_age'] = 0
-        
-        # Calculate bars since base change
-        base_change_indices = dataframe[dataframe['base_changed']].index
-        for i, idx in enumerate(dataframe.index):
-            if len(base_change_indices) > 0:
-                # Find most recent base change
-                recent_changes = base_change_indices[base_change_indices <= idx]
-                if len(recent_changes) > 0:
-                    last_change = recent_changes[-1]
-                    dataframe.loc[idx, 'base_age'] = idx - last_change
+                    # Store as qfl_* columns for easier access
+                    for column in ('fractal_up', 'fractal_down', 'base_age'):
+                        values = qfl_indicators[column].to_numpy()[positions]
+                        dataframe[f'qfl_{column}'] = np.where(merged, values, np.nan)
         
         return dataframe
     
@@ -184,48 +123,36 @@ class QFL_Strategy_SLTP(IStrategy):
         QFL Entry Logic
         Pine: buy = 100*(close/fdowntf) < 100 - percentage and agecond
         """
-        # Age condition (Pine: agecond = maxbaseage == 0 or age < maxbaseage)
-        age_condition = (
-            (self.max_base_age == 0) | 
-            (dataframe['qfl_base_age'] < self.max_base_age)
-        )
+        # Conditions are collected as bool arrays and combined with np.logical_and.reduce
+        fractal_down = dataframe['qfl_fractal_down'].to_numpy()
         
         # Calculate percentage below fractal
-        dataframe['price_pct_below_fractal'] = 100 * (dataframe['close'] / dataframe['qfl_fractal_down'])
-        dataframe['buy_threshold'] = 100 - self.buy_percentage.value
+        price_pct_below_fractal = 100 * (dataframe['close'].to_numpy() / fractal_down)
+        buy_threshold = 100 - self.buy_percentage.value
         
         # Long entry: price falls X% below down fractal (QFL "crack")
         # Pine: signal = buy and (allowConsecutiveSignals or not buy[1] or fdowntf != fdowntf[1])
-        buy_condition = (
-            (dataframe['price_pct_below_fractal'] < dataframe['buy_threshold']) &
-            age_condition &
-            (dataframe['qfl_fractal_down'].notna()) &
-            (dataframe['volume'] > 0)
-        )
+        buy_masks = [
+            price_pct_below_fractal < buy_threshold,
+            ~np.isnan(fractal_down),
+            dataframe['volume'].to_numpy() > 0,
+        ]
+        
+        # Age condition (Pine: agecond = maxbaseage == 0 or age < maxbaseage)
+        if self.max_base_age != 0:
+            buy_masks.append(dataframe['qfl_base_age'].to_numpy() < self.max_base_age)
+        
+        buy_condition = np.logical_and.reduce(buy_masks)
         
         # Handle consecutive signals like Pine Script
         if not self.allow_consecutive_signals:
             # Only trigger if not triggered on previous bar OR fractal changed
-            fractal_changed = dataframe['qfl_fractal_down'] != dataframe['qfl_fractal_down'].shift(1)
-            buy_condition = buy_condition & (
-                (~buy_condition.shift(1).fillna(False)) | 
-                fractal_changed
-            )
-        
-        # Debug logging - show ALL signals that trigger
-        # signal_rows = dataframe[buy_condition]
-        # if len(signal_rows) > 0:
-        #     print(f"\n🚨 QFL BUY SIGNALS DETECTED ({len(signal_rows)} signals):")
-        #     for idx, row in signal_rows.iterrows():
-        #         print(f"  📅 {row.name} | 💰 BTC Price: ${row['close']:.2f} | 📉 Fractal Base: ${row['qfl_fractal_down']:.2f} | 📊 Below%: {row['price_pct_below_fractal']:.2f}% (threshold: {row['buy_threshold']:.2f}%) | 🕐 Age: {row['qfl_base_age']}")
-        # else:
-        #     print(f"\n❌ No QFL buy signals found in this period")
-        #     # Show some sample conditions for debugging
-        #     recent_data = dataframe.tail(5)
-        #     print(f"DEBUG: Recent conditions (last 5 rows):")
-        #     for idx, row in recent_data.iterrows():
-        #         below_threshold = row['price_pct_below_fractal'] < row['buy_threshold']
-        #         print(f"  {row.name}: close=${row['close']:.2f}, fractal=${row['qfl_fractal_down']:.2f}, below%={row['price_pct_below_fractal']:.2f}%, threshold={row['buy_threshold']:.2f}%, below_threshold={below_threshold}")
+            # (the first bar and NaN-to-NaN bars count as changed, like != shift(1))
+            fractal_changed = np.ones(len(fractal_down), dtype=bool)
+            fractal_changed[1:] = fractal_down[1:] != fractal_down[:-1]
+            previous_buy = np.zeros(len(buy_condition), dtype=bool)
+            previous_buy[1:] = buy_condition[:-1]
+            buy_condition = buy_condition & (~previous_buy | fractal_changed)
         
         dataframe.loc[buy_condition, 'enter_long'] = 1
         
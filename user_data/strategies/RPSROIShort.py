@@ -1,12 +1,28 @@
 # pragma pylint: disable=missing-docstring, invalid-name, too-few-public-methods
 # pragma pylint: disable=too-many-instance-attributes, too-many-arguments, too-many-locals
 
+from typing import Dict
+
 import pandas as pd
 import numpy as np
 from pandas import DataFrame
 from freqtrade.strategy import IStrategy, DecimalParameter, IntParameter, CategoricalParameter, BooleanParameter
 import talib.abstract as ta
 
+import _rps_kernels
+
+# RSI of each source type, keyed by pair, timeframe, source type and the candles
+# it was computed from. Kept at module level so the hyperopt epochs a worker
+# process runs share it; the source is fixed for a whole backtest.
+_RSI_CACHE: Dict[tuple, np.ndarray] = {}
+_RSI_CACHE_SIZE = 128
+
+# Default-parameter base indicators, keyed by pair, timeframe, whether the VWMA
+# slow columns are included and the candles they were computed from. Kept at
+# module level like the RSI cache so they outlive a single strategy copy.
+_BASE_CACHE: Dict[tuple, dict] = {}
+_BASE_CACHE_SIZE = 128
+
 
 class RPSROIShort(IStrategy):
     """
@@ -85,22 +101,47 @@ class RPSROIShort(IStrategy):
         """
         Calculate Volume Weighted Moving Average
         VWMA = Sum(Close * Volume) / Sum(Volume) over period
+        Both window sums are differences of a single cumulative sum.
         """
-        volume_price = dataframe['close'] * dataframe['volume']
-        return volume_price.rolling(window=period).sum() / dataframe['volume'].rolling(window=period).sum()
+        volume = dataframe['volume'].to_numpy(dtype=np.float64)
+        volume_price = dataframe['close'].to_numpy(dtype=np.float64) * volume
+        vwma = np.full(len(volume), np.nan)
+        if len(volume) >= period:
+            cum_volume_price = np.empty(len(volume) + 1)
+            cum_volume_price[0] = 0.0
+            np.cumsum(volume_price, out=cum_volume_price[1:])
+            cum_volume = np.empty(len(volume) + 1)
+            cum_volume[0] = 0.0
+            np.cumsum(volume, out=cum_volume[1:])
+            
+            # Windows without any traded volume stay NaN (0 / 0 with rolling sums);
+            # they are counted exactly since the float differences need not be 0
+            cum_traded = np.empty(len(volume) + 1, dtype=np.int64)
+            cum_traded[0] = 0
+            np.cumsum(volume > 0, out=cum_traded[1:])
+            traded = cum_traded[period:] - cum_traded[:-period] > 0
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                vwma[period - 1:] = np.where(
+                    traded,
+                    (cum_volume_price[period:] - cum_volume_price[:-period]) /
+                    (cum_volume[period:] - cum_volume[:-period]),
+                    np.nan
+                )
+        return pd.Series(vwma, index=dataframe.index)
     
-    def calculate_slope_angle(self, ma_series: pd.Series, slope_bars: int) -> pd.Series:
+    def calculate_slope_angle(self, ma_series: pd.Series, slope_bars: int) -> np.ndarray:
         """
         Calculate slope using: slope = (ma - ma[slopeBars]) / slopeBars
         Convert slope to angle: slopeAngle = arctan(slope) * 180 / pi
         """
-        # Calculate slope over slope_bars periods
-        slope = (ma_series - ma_series.shift(slope_bars)) / slope_bars
+        # Calculate slope over slope_bars periods (NaN until slope_bars bars are available)
+        ma = ma_series.to_numpy(dtype=np.float64)
+        slope = np.full(len(ma), np.nan)
+        slope[slope_bars:] = (ma[slope_bars:] - ma[:-slope_bars]) / slope_bars
         
         # Convert slope to angle in degrees
-        slope_angle = np.arctan(slope) * 180 / np.pi
-        
-        return slope_angle
+        return np.degrees(np.arctan(slope))
     
     def get_rsi_source(self, dataframe: DataFrame, source_type: str) -> pd.Series:
         """
@@ -115,59 +156,117 @@ class RPSROIShort(IStrategy):
         else:
             return dataframe['close']  # Default fallback
     
-    def calculate_rsi_pnr_sell(self, rsi_series: pd.Series, lookback: int, percentile_window: int) -> tuple:
+    def candle_key(self, dataframe: DataFrame) -> tuple:
+        """
+        Identifies the candles cached indicators were computed from
+        """
+        return (len(dataframe), dataframe['date'].iloc[0], dataframe['date'].iloc[-1])
+    
+    def cached_rsi(self, dataframe: DataFrame, metadata: dict, source_type: str) -> np.ndarray:
+        """
+        RSI(14) of the selected source, reused from the cache while the candles
+        are unchanged
+        """
+        cache_key = (metadata['pair'], self.timeframe, source_type) + self.candle_key(dataframe)
+        rsi = _RSI_CACHE.get(cache_key)
+        if rsi is None:
+            rsi_source = self.get_rsi_source(dataframe, source_type)
+            rsi = np.asarray(ta.RSI(rsi_source, timeperiod=14), dtype=np.float64)
+            if len(_RSI_CACHE) >= _RSI_CACHE_SIZE:
+                _RSI_CACHE.pop(next(iter(_RSI_CACHE)))
+            _RSI_CACHE[cache_key] = rsi
+        return rsi
+    
+    def calculate_rsi_pnr_sell(self, rsi: np.ndarray, lookback: int, percentile_window: int) -> tuple:
         """
         Calculate RSI PNR components for SELL signal (short entry)
-        Returns rsidiffMAX and its threshold
+        Returns rsidiffMAX and its threshold as arrays, using the _rps_kernels
+        rolling kernels when numba is installed.
         """
+        if _rps_kernels.NUMBA_AVAILABLE:
+            rsidiffMAX = rsi - _rps_kernels.rolling_min(rsi, lookback)
+            rsidiffMAX_threshold = _rps_kernels.rolling_quantile(rsidiffMAX, percentile_window, 0.99)
+            return rsidiffMAX, rsidiffMAX_threshold
+        
         # Calculate rsidiffMAX for sell signal (how far RSI is above recent low)
+        rsi_series = pd.Series(rsi)
         rsidiffMAX = rsi_series - rsi_series.rolling(window=lookback).min()
         
         # Calculate 99th percentile threshold
         rsidiffMAX_threshold = rsidiffMAX.rolling(window=percentile_window).quantile(0.99)
         
-        return rsidiffMAX, rsidiffMAX_threshold
+        return rsidiffMAX.to_numpy(), rsidiffMAX_threshold.to_numpy()
     
-    def calculate_rsi_pnr_buy(self, rsi_series: pd.Series, lookback: int, percentile_window: int) -> tuple:
+    def calculate_rsi_pnr_buy(self, rsi: np.ndarray, lookback: int, percentile_window: int) -> tuple:
         """
         Calculate RSI PNR components for BUY signal (short exit)
-        Returns rsidiffMIN and its threshold
+        Returns rsidiffMIN and its threshold as arrays, using the _rps_kernels
+        rolling kernels when numba is installed.
         """
+        if _rps_kernels.NUMBA_AVAILABLE:
+            rsidiffMIN = _rps_kernels.rolling_max(rsi, lookback) - rsi
+            rsidiffMIN_threshold = _rps_kernels.rolling_quantile(rsidiffMIN, percentile_window, 0.99)
+            return rsidiffMIN, rsidiffMIN_threshold
+        
         # Calculate rsidiffMIN for buy signal (how far RSI is below recent high)
+        rsi_series = pd.Series(rsi)
         rsidiffMIN = rsi_series.rolling(window=lookback).max() - rsi_series
         
         # Calculate 99th percentile threshold
         rsidiffMIN_threshold = rsidiffMIN.rolling(window=percentile_window).quantile(0.99)
         
-        return rsidiffMIN, rsidiffMIN_threshold
+        return rsidiffMIN.to_numpy(), rsidiffMIN_threshold.to_numpy()
     
-    def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+    def calculate_base_indicators(self, dataframe: DataFrame, use_default_vwma: bool) -> dict:
         """
-        Populate indicators for RSI PNR Slope short strategy
+        Base indicators with default parameters, as arrays keyed by column name.
+        The VWMA slow columns are skipped when populate_entry_trend recalculates them anyway.
+        Columns no signal reads are stored as float32; the slope stays float64.
         """
-        # Calculate VWMA slow with default period (will be optimized in populate_entry_trend)
-        dataframe['vwma_slow_base'] = self.vwma(dataframe, 300)
+        base = {}
         
-        # Calculate slope angle of slow VWMA using default slope_bars (3)
-        dataframe['vwma_slow_slope_base'] = self.calculate_slope_angle(dataframe['vwma_slow_base'], 3)
+        if use_default_vwma:
+            # Calculate VWMA slow with default period (will be optimized in populate_entry_trend)
+            vwma_slow = self.vwma(dataframe, 300)
+            base['vwma_slow_base'] = vwma_slow.to_numpy(dtype=np.float32)
+            
+            # Calculate slope angle of slow VWMA using default slope_bars (3)
+            base['vwma_slow_slope_base'] = self.calculate_slope_angle(vwma_slow, 3)
         
         # Calculate RSI with default parameters (will be recalculated with hyperopt params)
         rsi_source = self.get_rsi_source(dataframe, 'close')
-        dataframe['rsi_base'] = ta.RSI(rsi_source, timeperiod=14)
+        rsi = np.asarray(ta.RSI(rsi_source, timeperiod=14), dtype=np.float64)
+        base['rsi_base'] = rsi.astype(np.float32)
         
         # Calculate RSI PNR for sell signal with default parameters
-        rsidiffMAX, rsidiffMAX_threshold = self.calculate_rsi_pnr_sell(
-            dataframe['rsi_base'], 10, 150
-        )
-        dataframe['rsidiffMAX_base'] = rsidiffMAX
-        dataframe['rsidiffMAX_threshold_base'] = rsidiffMAX_threshold
+        rsidiffMAX, rsidiffMAX_threshold = self.calculate_rsi_pnr_sell(rsi, 10, 150)
+        base['rsidiffMAX_base'] = rsidiffMAX.astype(np.float32)
+        base['rsidiffMAX_threshold_base'] = rsidiffMAX_threshold.astype(np.float32)
         
         # Calculate RSI PNR for buy signal with default parameters
-        rsidiffMIN, rsidiffMIN_threshold = self.calculate_rsi_pnr_buy(
-            dataframe['rsi_base'], 10, 150
-        )
-        dataframe['rsidiffMIN_base'] = rsidiffMIN
-        dataframe['rsidiffMIN_threshold_base'] = rsidiffMIN_threshold
+        rsidiffMIN, rsidiffMIN_threshold = self.calculate_rsi_pnr_buy(rsi, 10, 150)
+        base['rsidiffMIN_base'] = rsidiffMIN.astype(np.float32)
+        base['rsidiffMIN_threshold_base'] = rsidiffMIN_threshold.astype(np.float32)
+        
+        return base
+    
+    def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        """
+        Populate indicators for RSI PNR Slope short strategy
+        """
+        # The base columns only depend on the candles, so they are computed once per
+        # pair and reused until a new candle arrives
+        use_default_vwma = self.vwma_slow.value == 300 and self.slope_bars.value == 3
+        cache_key = (metadata['pair'], self.timeframe, use_default_vwma) + self.candle_key(dataframe)
+        base = _BASE_CACHE.get(cache_key)
+        if base is None:
+            base = self.calculate_base_indicators(dataframe, use_default_vwma)
+            if len(_BASE_CACHE) >= _BASE_CACHE_SIZE:
+                _BASE_CACHE.pop(next(iter(_BASE_CACHE)))
+            _BASE_CACHE[cache_key] = base
+        
+        for column, values in base.items():
+            dataframe[column] = values
         
         return dataframe
     
@@ -176,53 +275,62 @@ class RPSROIShort(IStrategy):
         Entry logic: Short when RSI PNR sell signal occurs while VWMA slow has downward slope
         Use hyperopt parameters to modify base calculations
         """
+        # Hyperopt parameters are read once per call
+        vwma_slow_period = int(self.vwma_slow.value)
+        slope_bars = int(self.slope_bars.value)
+        sell_rsi_lookback = int(self.sell_rsi_lookback.value)
+        sell_rsi_percentile_window = int(self.sell_rsi_percentile_window.value)
+        source_type = self.source_type.value
+        use_vwma_filter = self.use_vwma_filter.value
+        max_slope_slow = self.max_slope_slow.value
         
         # Recalculate VWMA slow with hyperopt parameters if they differ from defaults
-        if self.vwma_slow.value != 300 or self.slope_bars.value != 3:
-            dataframe['vwma_slow'] = self.vwma(dataframe, self.vwma_slow.value)
-            dataframe['vwma_slow_slope'] = self.calculate_slope_angle(dataframe['vwma_slow'], self.slope_bars.value)
+        # (or if populate_indicators skipped the base columns for non-default parameters)
+        if vwma_slow_period != 300 or slope_bars != 3 or 'vwma_slow_slope_base' not in dataframe:
+            vwma_slow = self.vwma(dataframe, vwma_slow_period)
+            vwma_slow_slope = self.calculate_slope_angle(vwma_slow, slope_bars)
+            dataframe['vwma_slow'] = vwma_slow.astype(np.float32)
+            dataframe['vwma_slow_slope'] = vwma_slow_slope
         else:
+            vwma_slow_slope = dataframe['vwma_slow_slope_base'].to_numpy()
             dataframe['vwma_slow'] = dataframe['vwma_slow_base']
-            dataframe['vwma_slow_slope'] = dataframe['vwma_slow_slope_base']
+            dataframe['vwma_slow_slope'] = vwma_slow_slope
         
-        # Recalculate RSI with hyperopt parameters
-        rsi_source = self.get_rsi_source(dataframe, self.source_type.value)
-        dataframe['rsi'] = ta.RSI(rsi_source, timeperiod=14)
+        # Recalculate RSI with hyperopt parameters (source and RSI are reused across epochs)
+        rsi = self.cached_rsi(dataframe, metadata, source_type)
         
         # Calculate RSI PNR for sell signal with sell space hyperopt parameters
         rsidiffMAX, rsidiffMAX_threshold = self.calculate_rsi_pnr_sell(
-            dataframe['rsi'], self.sell_rsi_lookback.value, self.sell_rsi_percentile_window.value
+            rsi, sell_rsi_lookback, sell_rsi_percentile_window
         )
-        dataframe['rsidiffMAX'] = rsidiffMAX
-        dataframe['rsidiffMAX_threshold'] = rsidiffMAX_threshold
         
-        # Calculate crossover signals
-        dataframe['rsidiffMAX_prev'] = dataframe['rsidiffMAX'].shift(1)
-        dataframe['rsidiffMAX_threshold_prev'] = dataframe['rsidiffMAX_threshold'].shift(1)
+        # The signal is computed from the float64 arrays below; the RSI and RSI PNR
+        # columns are only plotted, so they are stored as float32
+        dataframe['rsi'] = rsi.astype(np.float32)
+        dataframe['rsidiffMAX'] = rsidiffMAX.astype(np.float32)
+        dataframe['rsidiffMAX_threshold'] = rsidiffMAX_threshold.astype(np.float32)
         
         # RSI PNR Sell signal: rsidiffMAX crosses above its threshold (sell signal "s")
-        dataframe['rsi_pnr_sell_signal'] = (
-            (dataframe['rsidiffMAX'] > dataframe['rsidiffMAX_threshold']) &
-            (dataframe['rsidiffMAX_prev'] <= dataframe['rsidiffMAX_threshold_prev'])
+        # Compared on the arrays with the previous bar as a slice (no shifted columns);
+        # NaN comparisons are False, as is the first bar which has no previous one
+        rsi_pnr_sell_signal = np.zeros(len(rsidiffMAX), dtype=bool)
+        rsi_pnr_sell_signal[1:] = (
+            (rsidiffMAX[1:] > rsidiffMAX_threshold[1:]) &
+            (rsidiffMAX[:-1] <= rsidiffMAX_threshold[:-1])
         )
-        
-        # Handle NaN values in slope angle
-        dataframe['vwma_slow_slope_clean'] = dataframe['vwma_slow_slope'].fillna(0)
+        dataframe['rsi_pnr_sell_signal'] = rsi_pnr_sell_signal
         
         # Entry conditions for short with optional VWMA filter
-        if self.use_vwma_filter.value:
-            short_condition = (
-                dataframe['rsi_pnr_sell_signal'] &
-                (dataframe['vwma_slow_slope_clean'] < self.max_slope_slow.value) &
-                (dataframe['volume'] > 0)
-            )
-        else:
-            short_condition = (
-                dataframe['rsi_pnr_sell_signal'] &
-                (dataframe['volume'] > 0)
-            )
+        # (bool arrays combined with np.logical_and.reduce)
+        short_masks = [
+            rsi_pnr_sell_signal,
+            dataframe['volume'].to_numpy() > 0,
+        ]
+        if use_vwma_filter:
+            # NaN slope angles (VWMA warm-up) count as 0, without a cleaned column
+            short_masks.append(np.nan_to_num(vwma_slow_slope, nan=0.0) < max_slope_slow)
         
-        dataframe.loc[short_condition, 'enter_short'] = 1
+        dataframe.loc[np.logical_and.reduce(short_masks), 'enter_short'] = 1
         
         return dataframe
     
@@ -38,14 +38,12 @@ Usage
 © 2025 Mariano / ChatGPT — MIT-style licence. Use at your own risk.
 """
 
-from functools import reduce
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import numpy as np
-import pandas as pd
 from pandas import DataFrame
 
-import talib.abstract as ta
+import talib
 from freqtrade.strategy import (
     BooleanParameter,
     CategoricalParameter,
@@ -116,6 +114,11 @@ class ScalpHybridStrategy(IStrategy):
         "stoploss_on_exchange": False,
     }
 
+    def __init__(self, config: dict) -> None:
+        super().__init__(config)
+        # ATR of the last analyzed candle per pair (live / dry-run only)
+        self._last_atr: Dict[str, float] = {}
+
     # ============================
     # Indicator calculation
     # ============================
@@ -124,135 +127,179 @@ class ScalpHybridStrategy(IStrategy):
         ema_fast_len = int(self.ema_fast_period.value)
         ema_slow_len = int(self.ema_slow_period.value)
 
-        dataframe["ema_fast"] = ta.EMA(dataframe, timeperiod=ema_fast_len)
-        dataframe["ema_slow"] = ta.EMA(dataframe, timeperiod=ema_slow_len)
+        # TA-Lib functions are called directly on the OHLCV arrays, extracted once
+        # (same defaults as the abstract API: MFI/ATR/ADX 14, STOCH 5/3/3 SMA)
+        high = dataframe["high"].to_numpy(dtype=np.float64)
+        low = dataframe["low"].to_numpy(dtype=np.float64)
+        close = dataframe["close"].to_numpy(dtype=np.float64)
+        volume = dataframe["volume"].to_numpy(dtype=np.float64)
+
+        dataframe["ema_fast"] = talib.EMA(close, timeperiod=ema_fast_len)
+        dataframe["ema_slow"] = talib.EMA(close, timeperiod=ema_slow_len)
 
-        dataframe["rsi"] = ta.RSI(dataframe, timeperiod=14)
-        dataframe["mfi"] = ta.MFI(dataframe)
+        dataframe["rsi"] = talib.RSI(close, timeperiod=14)
+        dataframe["mfi"] = talib.MFI(high, low, close, volume, timeperiod=14)
 
-        slowk, slowd = ta.STOCH(dataframe)
+        slowk, slowd = talib.STOCH(high, low, close)
         dataframe["stoch_k"], dataframe["stoch_d"] = slowk, slowd
 
         # Bollinger Bands using hyperopt-able multiplier
-        bb = ta.BBANDS(dataframe, timeperiod=20, nbdevup=self.bb_mult.value, nbdevdn=self.bb_mult.value, matype=0)
-        dataframe["bb_lower"] = bb['lowerband']
-        dataframe["bb_mid"] = bb['middleband']
-        dataframe["bb_upper"] = bb['upperband']
-        dataframe["bb_width"] = (bb['upperband'] - bb['lowerband']) / bb['middleband']
-
-        dataframe["atr"] = ta.ATR(dataframe, timeperiod=14)
-        dataframe["adx"] = ta.ADX(dataframe)
-
-        # Volume filter
-        dataframe["vol_mean"] = dataframe["volume"].rolling(20).mean()
-        dataframe["vol_ok"] = dataframe["volume"] > dataframe["vol_mean"] * self.vol_mult.value
+        bb_upper, bb_mid, bb_lower = talib.BBANDS(
+            close, timeperiod=20, nbdevup=self.bb_mult.value, nbdevdn=self.bb_mult.value, matype=0
+        )
+        dataframe["bb_lower"] = bb_lower
+        dataframe["bb_mid"] = bb_mid
+        dataframe["bb_upper"] = bb_upper
+        dataframe["bb_width"] = (bb_upper - bb_lower) / bb_mid
+
+        dataframe["atr"] = talib.ATR(high, low, close, timeperiod=14)
+        dataframe["adx"] = talib.ADX(high, low, close, timeperiod=14)
+
+        # Volume filter: 20-bar mean volume as a difference of cumulative sums
+        vol_mean = np.full(len(volume), np.nan)
+        if len(volume) >= 20:
+            cum_volume = np.empty(len(volume) + 1)
+            cum_volume[0] = 0.0
+            np.cumsum(volume, out=cum_volume[1:])
+            # Windows without any traded volume are exactly 0, as with rolling().mean()
+            cum_traded = np.empty(len(volume) + 1, dtype=np.int64)
+            cum_traded[0] = 0
+            np.cumsum(volume > 0, out=cum_traded[1:])
+            traded = cum_traded[20:] - cum_traded[:-20] > 0
+            vol_mean[19:] = np.where(traded, (cum_volume[20:] - cum_volume[:-20]) / 20, 0.0)
+        dataframe["vol_mean"] = vol_mean
+        dataframe["vol_ok"] = volume > vol_mean * self.vol_mult.value
 
         # --- Higher TF (1 h) ---
         informative = self.dp.get_pair_dataframe(pair=metadata["pair"], timeframe=self.informative_tf)
-        informative["ema_fast"] = ta.EMA(informative, timeperiod=ema_fast_len)
-        informative["ema_slow"] = ta.EMA(informative, timeperiod=ema_slow_len)
-        informative["trend_ok"] = informative["ema_fast"] > informative["ema_slow"]
+        informative_close = informative["close"].to_numpy(dtype=np.float64)
+        informative["ema_fast"] = talib.EMA(informative_close, timeperiod=ema_fast_len)
+        informative["ema_slow"] = talib.EMA(informative_close, timeperiod=ema_slow_len)
+        informative["trend_ok"] = informative["ema_fast"].to_numpy() > informative["ema_slow"].to_numpy()
 
         dataframe = merge_informative_pair(dataframe, informative, self.timeframe, self.informative_tf, ffill=True)
 
-        # Add plotting reference lines and condition indicators
-        dataframe['buy_rsi_line'] = self.buy_rsi.value
-        dataframe['sell_rsi_line'] = self.sell_rsi.value
-        dataframe['adx_threshold_line'] = self.adx_threshold.value
-        
-        # Add individual condition checks for visual debugging (handle NaN values)
-        dataframe['cond1_rsi'] = (dataframe['rsi'] < self.buy_rsi.value).fillna(False).astype(int)
-        dataframe['cond2_bb'] = (dataframe['close'] < dataframe['bb_lower']).fillna(False).astype(int)
-        dataframe['cond3_ema'] = (dataframe['ema_fast'] > dataframe['ema_slow']).fillna(False).astype(int)
-        dataframe['cond4_adx'] = (dataframe['adx'] > self.adx_threshold.value).fillna(False).astype(int)
-        dataframe['cond5_vol'] = dataframe['vol_ok'].fillna(False).astype(int)
-        dataframe['cond6_trend'] = dataframe['trend_ok_1h'].fillna(False).astype(int)
-        
-        # Count how many conditions are met
-        dataframe['conditions_met'] = (
-            dataframe['cond1_rsi'] + 
-            dataframe['cond2_bb'] + 
-            dataframe['cond3_ema'] + 
-            dataframe['cond4_adx'] + 
-            dataframe['cond5_vol'] + 
-            dataframe['cond6_trend']
-        )
+        # Plotting reference lines and condition indicators are only needed by the
+        # web UI / plot-dataframe, so backtesting and hyperopt skip them
+        if self.plot_indicators_enabled():
+            dataframe['buy_rsi_line'] = self.buy_rsi.value
+            dataframe['sell_rsi_line'] = self.sell_rsi.value
+            dataframe['adx_threshold_line'] = self.adx_threshold.value
+            
+            # Add individual condition checks for visual debugging (NaN counts as not met)
+            dataframe['cond1_rsi'] = (dataframe['rsi'] < self.buy_rsi.value).astype(np.int8)
+            dataframe['cond2_bb'] = (dataframe['close'] < dataframe['bb_lower']).astype(np.int8)
+            dataframe['cond3_ema'] = (dataframe['ema_fast'] > dataframe['ema_slow']).astype(np.int8)
+            dataframe['cond4_adx'] = (dataframe['adx'] > self.adx_threshold.value).astype(np.int8)
+            dataframe['cond5_vol'] = dataframe['vol_ok'].astype(np.int8)
+            dataframe['cond6_trend'] = dataframe['trend_ok_1h'].eq(True).astype(np.int8)
+            
+            # Count how many conditions are met
+            dataframe['conditions_met'] = (
+                dataframe['cond1_rsi'] + 
+                dataframe['cond2_bb'] + 
+                dataframe['cond3_ema'] + 
+                dataframe['cond4_adx'] + 
+                dataframe['cond5_vol'] + 
+                dataframe['cond6_trend']
+            )
+
+        # Live and dry-run analyze up to the current candle, so the per-trade callbacks can
+        # use this ATR directly. Backtesting slices the analyzed frame per candle instead.
+        if self.dp.runmode.value in ("live", "dry_run"):
+            self._last_atr[metadata["pair"]] = float(dataframe["atr"].iat[-1])
 
         return dataframe
 
+    def plot_indicators_enabled(self) -> bool:
+        """Plot-only indicators are skipped in backtesting and hyperopt."""
+        return not (self.dp and self.dp.runmode.value in ("backtest", "hyperopt"))
+
     # ============================
     # Entry logic — LONG
     # ============================
     def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:  # type: ignore[override]
-        conditions: List[pd.Series] = []
-
-        conditions.append(dataframe["rsi"] < self.buy_rsi.value)
-        conditions.append(dataframe["close"] < dataframe["bb_lower"])
-        conditions.append(dataframe["ema_fast"] > dataframe["ema_slow"])
-        conditions.append(dataframe["adx"] > self.adx_threshold.value)
-        conditions.append(dataframe["vol_ok"])
-        conditions.append(dataframe["trend_ok_1h"])
+        # Conditions are bool arrays combined in one np.logical_and.reduce pass.
+        # trend_ok_1h is an object column after the merge; candles before the first
+        # 1 h candle (NaN) count as neither trend up nor trend down.
+        conditions: List[np.ndarray] = []
+
+        conditions.append(dataframe["rsi"].to_numpy() < self.buy_rsi.value)
+        conditions.append(dataframe["close"].to_numpy() < dataframe["bb_lower"].to_numpy())
+        conditions.append(dataframe["ema_fast"].to_numpy() > dataframe["ema_slow"].to_numpy())
+        conditions.append(dataframe["adx"].to_numpy() > self.adx_threshold.value)
+        conditions.append(dataframe["vol_ok"].to_numpy(dtype=bool))
+        conditions.append(dataframe["trend_ok_1h"].eq(True).to_numpy())
 
         if conditions:
-            dataframe.loc[reduce(lambda x, y: x & y, conditions), "enter_long"] = 1
+            dataframe.loc[np.logical_and.reduce(conditions), "enter_long"] = 1
         return dataframe
 
     # ============================
     # Entry logic — SHORT
     # ============================
     def populate_entry_short_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:  # type: ignore[override]
-        conditions: List[pd.Series] = []
+        conditions: List[np.ndarray] = []
 
-        conditions.append(dataframe["rsi"] > self.sell_rsi.value)
-        conditions.append(dataframe["close"] > dataframe["bb_upper"])
-        conditions.append(dataframe["ema_fast"] < dataframe["ema_slow"])
-        conditions.append(dataframe["adx"] > self.adx_threshold.value)
-        conditions.append(dataframe["vol_ok"])
-        conditions.append(~dataframe["trend_ok_1h"])
+        conditions.append(dataframe["rsi"].to_numpy() > self.sell_rsi.value)
+        conditions.append(dataframe["close"].to_numpy() > dataframe["bb_upper"].to_numpy())
+        conditions.append(dataframe["ema_fast"].to_numpy() < dataframe["ema_slow"].to_numpy())
+        conditions.append(dataframe["adx"].to_numpy() > self.adx_threshold.value)
+        conditions.append(dataframe["vol_ok"].to_numpy(dtype=bool))
+        conditions.append(dataframe["trend_ok_1h"].eq(False).to_numpy())
 
         if conditions:
-            dataframe.loc[reduce(lambda x, y: x & y, conditions), "enter_short"] = 1
+            dataframe.loc[np.logical_and.reduce(conditions), "enter_short"] = 1
         return dataframe
 
     # ============================
     # Exit logic — LONG
     # ============================
     def populate_exit_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:  # type: ignore[override]
-        conditions: List[pd.Series] = []
+        conditions: List[np.ndarray] = []
 
-        conditions.append(dataframe["rsi"] > self.sell_rsi.value)
-        conditions.append(dataframe["close"] > dataframe["bb_mid"])
-        conditions.append(dataframe["ema_fast"] < dataframe["ema_slow"])  # fast momentum stall
+        conditions.append(dataframe["rsi"].to_numpy() > self.sell_rsi.value)
+        conditions.append(dataframe["close"].to_numpy() > dataframe["bb_mid"].to_numpy())
+        conditions.append(dataframe["ema_fast"].to_numpy() < dataframe["ema_slow"].to_numpy())  # fast momentum stall
 
         if conditions:
-            dataframe.loc[reduce(lambda x, y: x | y, conditions), "exit_long"] = 1
+            dataframe.loc[np.logical_or.reduce(conditions), "exit_long"] = 1
         return dataframe
 
     # ============================
     # Exit logic — SHORT
     # ============================
     def populate_exit_short_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:  # type: ignore[override]
-        conditions: List[pd.Series] = []
+        conditions: List[np.ndarray] = []
 
-        conditions.append(dataframe["rsi"] < self.buy_rsi.value)
-        conditions.append(dataframe["close"] < dataframe["bb_mid"])
-        conditions.append(dataframe["ema_fast"] > dataframe["ema_slow"])  # trend flip
+        conditions.append(dataframe["rsi"].to_numpy() < self.buy_rsi.value)
+        conditions.append(dataframe["close"].to_numpy() < dataframe["bb_mid"].to_numpy())
+        conditions.append(dataframe["ema_fast"].to_numpy() > dataframe["ema_slow"].to_numpy())  # trend flip
 
         if conditions:
-            dataframe.loc[reduce(lambda x, y: x | y, conditions), "exit_short"] = 1
+            dataframe.loc[np.logical_or.reduce(conditions), "exit_short"] = 1
         return dataframe
 
+    def last_atr(self, pair: str) -> Optional[float]:
+        """ATR of the last analyzed candle, or None when the pair has no analyzed data."""
+        last_atr = self._last_atr.get(pair)
+        if last_atr is not None:
+            return last_atr
+
+        dataframe, _ = self.dp.get_analyzed_dataframe(pair, self.timeframe)
+        if dataframe is None or len(dataframe) < 1:
+            return None
+        return dataframe["atr"].iat[-1]
+
     # ============================
     # Custom stake amount — risk-per-trade position sizing
     # ============================
     def custom_stake_amount(self, pair: str, current_time, current_rate, proposed_stake, min_stake, max_stake, **kwargs):
         """Calculate position size based on risk per trade."""
         try:
-            dataframe, _ = self.dp.get_analyzed_dataframe(pair, self.timeframe)
-            if dataframe is None or len(dataframe) < 1:
+            last_atr = self.last_atr(pair)
+            if last_atr is None:
                 return proposed_stake
-                
-            last_atr = dataframe.iloc[-1]["atr"]
             
             # Calculate stop percentage
             static_stop_pct = abs(self.stoploss)
@@ -281,11 +328,10 @@ class ScalpHybridStrategy(IStrategy):
     def custom_stoploss(self, pair: str, trade, current_time, current_rate, current_profit, **kwargs):  # noqa: N802,E501
         """Tighter dynamic SL: once in profit, follow price at 1 × ATR below/above close."""
         try:
-            dataframe, _ = self.dp.get_analyzed_dataframe(pair, self.timeframe)
-            if dataframe is None or len(dataframe) < 1:
+            last_atr = self.last_atr(pair)
+            if last_atr is None:
                 return self.stoploss
 
-            last_atr = dataframe.iloc[-1]["atr"]
             if current_profit > 0.01:
                 # Long trades: raise SL; Short trades: lower SL
                 if trade.is_short:
@@ -0,0 +1,98 @@
+"""
+Numba kernels shared by the Ornstein-Uhlenbeck strategies.
+
+numba is optional: when it is not installed NUMBA_AVAILABLE is False and the
+strategies fall back to their pandas implementation.
+
+Kernels are declared with explicit signatures, so numba compiles them eagerly
+when this module is imported (or loads them from the on-disk cache) rather
+than on the first call inside a backtest or hyperopt epoch.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that leaves the function as plain Python"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit('UniTuple(float64[:], 3)(float64[:], int64)', cache=True, fastmath=True)
+def ou_rolling(x, lookback):
+    """
+    Rolling OU parameters (θ, μ, σ) of x in a single pass.
+
+    Bar i uses x[i-lookback:i], matching the pandas estimate. Running sums of
+    the window and of its lag-1 pairs are updated in O(1) per bar. Returns
+    theta, mu and sigma arrays, NaN for the first `lookback` bars. x must not
+    contain NaN and must be float64.
+    """
+    n = x.shape[0]
+    theta = np.full(n, np.nan)
+    mu = np.full(n, np.nan)
+    sigma = np.full(n, np.nan)
+    if n <= lookback or lookback < 3:
+        return theta, mu, sigma
+
+    # Offset by the first value so the running sums stay small
+    offset = x[0]
+    pairs = lookback - 1
+
+    # Window sums (s, s2) and lag-1 pair sums: a = x[j-1], b = x[j]
+    s = 0.0
+    s2 = 0.0
+    for j in range(lookback):
+        v = x[j] - offset
+        s += v
+        s2 += v * v
+    sa = 0.0
+    saa = 0.0
+    sab = 0.0
+    for j in range(1, lookback):
+        a = x[j - 1] - offset
+        b = x[j] - offset
+        sa += a
+        saa += a * a
+        sab += a * b
+
+    for i in range(lookback, n):
+        if i > lookback:
+            # Slide the window from x[i-lookback-1:i-1] to x[i-lookback:i]
+            old = x[i - lookback - 1] - offset
+            new = x[i - 1] - offset
+            s += new - old
+            s2 += new * new - old * old
+            old_b = x[i - lookback] - offset
+            new_a = x[i - 2] - offset
+            sa += new_a - old
+            saa += new_a * new_a - old * old
+            sab += new_a * new - old * old_b
+
+        # The pairs' b values are the window without its first element
+        first = x[i - lookback] - offset
+        sb = s - first
+        sbb = s2 - first * first
+
+        mu[i] = s / lookback + offset
+        var = (s2 - s * s / lookback) / (lookback - 1)
+
+        cov = sab - sa * sb / pairs
+        var_a = saa - sa * sa / pairs
+        var_b = sbb - sb * sb / pairs
+        if var_a <= 0.0 or var_b <= 0.0:
+            continue
+        rho = cov / np.sqrt(var_a * var_b)
+        if rho <= 0.0:
+            continue
+        theta[i] = -np.log(rho)
+        if theta[i] > 0.0 and var > 0.0:
+            sigma[i] = np.sqrt(var) * np.sqrt(2.0 * theta[i])
+
+    return theta, mu, sigma
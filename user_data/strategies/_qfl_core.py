@@ -0,0 +1,167 @@
+"""
+QFL fractal and base detection shared by QFLRSI_Strategy and QFL_Strategy_SLTP.
+
+Translates the Pine Script QFL logic to Python. The fused numba kernel is used
+when numba is installed.
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+import talib.abstract as ta
+
+# numba is optional: without it NUMBA_AVAILABLE is False and the numpy
+# implementation below is used. The kernel's explicit signature compiles it when
+# this module is imported (or loads it from the on-disk cache).
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that leaves the function as plain Python"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit('Tuple((float64[:], float64[:], int64[:]))(float64[:], float64[:], float64[:], float64[:])', cache=True)
+def qfl_kernel(high, low, volume, volume_ma):
+    """
+    QFL fractal levels and base age in a single pass over the candles.
+
+    Returns fractal_up, fractal_down and base_age, matching the numpy version
+    of calculate_qfl_indicators: fractal levels are the high/low 3 bars back,
+    carried forward, and base_age counts bars since fractal_down last changed
+    (0 until the first base). fastmath is left off so NaN comparisons stay False.
+    """
+    n = high.shape[0]
+    fractal_up = np.full(n, np.nan)
+    fractal_down = np.full(n, np.nan)
+    base_age = np.zeros(n, dtype=np.int64)
+
+    last_up = np.nan
+    last_down = np.nan
+    last_change = -1
+    for i in range(n):
+        if i >= 5 and volume[i - 3] > volume_ma[i - 3]:
+            if (high[i - 3] > high[i - 4] and high[i - 4] > high[i - 5] and
+                    high[i - 2] < high[i - 3] and high[i - 1] < high[i - 2]):
+                last_up = high[i - 3]
+            if (low[i - 3] < low[i - 4] and low[i - 4] < low[i - 5] and
+                    low[i - 2] > low[i - 3] and low[i - 1] > low[i - 2]):
+                # A new down fractal at the same level is not a base change
+                if low[i - 3] != last_down:
+                    last_change = i
+                last_down = low[i - 3]
+        fractal_up[i] = last_up
+        fractal_down[i] = last_down
+        if last_change >= 0:
+            base_age[i] = i - last_change
+
+    return fractal_up, fractal_down, base_age
+
+
+# Columns added by calculate_qfl_indicators, in qfl_kernel's output order. They
+# are cached per pair, timeframe, last candle, length and volume MA period; none
+# of them depend on the hyperopt spaces, so repeated populate_indicators calls on
+# the same candles (from either strategy) reuse them.
+QFL_COLUMNS = ['fractal_up', 'fractal_down', 'base_age']
+_QFL_CACHE: Dict[tuple, DataFrame] = {}
+_QFL_CACHE_SIZE = 128
+
+
+def cached_qfl_indicators(dataframe: DataFrame, pair: str, timeframe: str, volume_ma_period: int) -> DataFrame:
+    """
+    Date and QFL_COLUMNS of calculate_qfl_indicators, reused from the cache
+    while the candles are unchanged
+    """
+    if dataframe.empty:
+        return calculate_qfl_indicators(dataframe, volume_ma_period)[['date'] + QFL_COLUMNS]
+
+    cache_key = (pair, timeframe, dataframe['date'].iloc[-1], len(dataframe), volume_ma_period)
+    qfl_indicators = _QFL_CACHE.get(cache_key)
+    if qfl_indicators is None:
+        qfl_indicators = calculate_qfl_indicators(dataframe, volume_ma_period)[['date'] + QFL_COLUMNS]
+        if len(_QFL_CACHE) >= _QFL_CACHE_SIZE:
+            _QFL_CACHE.pop(next(iter(_QFL_CACHE)))
+        _QFL_CACHE[cache_key] = qfl_indicators
+    return qfl_indicators
+
+
+def calculate_qfl_indicators(dataframe: DataFrame, volume_ma_period: int) -> DataFrame:
+    """
+    Calculate QFL fractals and bases, adding QFL_COLUMNS (and volume_ma when
+    missing) to dataframe. The fractal conditions and base changes stay local.
+    """
+    # Volume moving average for fractal validation; populate_indicators has
+    # already added it when QFL runs on the base timeframe
+    if 'volume_ma' not in dataframe.columns:
+        dataframe['volume_ma'] = ta.SMA(dataframe['volume'], timeperiod=volume_ma_period)
+
+    high = dataframe['high'].to_numpy(dtype=np.float64)
+    low = dataframe['low'].to_numpy(dtype=np.float64)
+
+    # With numba the steps below run fused in a single pass over the candles
+    if NUMBA_AVAILABLE:
+        qfl_columns = qfl_kernel(high, low,
+                                 dataframe['volume'].to_numpy(dtype=np.float64),
+                                 dataframe['volume_ma'].to_numpy(dtype=np.float64))
+        for col, values in zip(QFL_COLUMNS, qfl_columns):
+            dataframe[col] = values
+        return dataframe
+
+    # Fractal detection (Pine: up/down conditions) on the raw arrays: slices stand
+    # in for shift(k), and the first 5 bars (which would compare against NaN) stay False
+    volume_confirmed = dataframe['volume'].to_numpy() > dataframe['volume_ma'].to_numpy()
+    fractal_up_condition = np.zeros(len(dataframe), dtype=bool)
+    fractal_down_condition = np.zeros(len(dataframe), dtype=bool)
+
+    # Up fractal: high[3]>high[4] and high[4]>high[5] and high[2]<high[3] and high[1]<high[2] and volume[3]>vam[3]
+    fractal_up_condition[5:] = (
+        (high[2:-3] > high[1:-4]) &
+        (high[1:-4] > high[:-5]) &
+        (high[3:-2] < high[2:-3]) &
+        (high[4:-1] < high[3:-2]) &
+        volume_confirmed[2:-3]
+    )
+
+    # Down fractal: low[3]<low[4] and low[4]<low[5] and low[2]>low[3] and low[1]>low[2] and volume[3]>vam[3]
+    fractal_down_condition[5:] = (
+        (low[2:-3] < low[1:-4]) &
+        (low[1:-4] < low[:-5]) &
+        (low[3:-2] > low[2:-3]) &
+        (low[4:-1] > low[3:-2]) &
+        volume_confirmed[2:-3]
+    )
+
+    # Track fractal levels (Pine: fractalupF() and fractaldownF() functions):
+    # the high/low 3 bars back is set where a fractal forms
+    fractal_up = np.full(len(dataframe), np.nan)
+    fractal_down = np.full(len(dataframe), np.nan)
+    up_idx = np.flatnonzero(fractal_up_condition)
+    down_idx = np.flatnonzero(fractal_down_condition)
+    fractal_up[up_idx] = high[up_idx - 3]
+    fractal_down[down_idx] = low[down_idx - 3]
+
+    # Forward fill fractal levels (Pine: fd := down ? low[3] : nz(fd[1]))
+    dataframe['fractal_up'] = pd.Series(fractal_up, index=dataframe.index).ffill()
+    dataframe['fractal_down'] = pd.Series(fractal_down, index=dataframe.index).ffill()
+    fractal_down = dataframe['fractal_down'].to_numpy()
+
+    # Calculate base age (Pine: barssince(fuptf != fuptf[1])); the bars before
+    # the first base compare NaN with NaN and do not count as base changes
+    previous_down = np.empty_like(fractal_down)
+    previous_down[:1] = np.nan
+    previous_down[1:] = fractal_down[:-1]
+    base_changed = (fractal_down != previous_down) & ~(np.isnan(fractal_down) & np.isnan(previous_down))
+
+    # Calculate bars since base change: carry the position of the last change forward
+    positions = np.arange(len(dataframe))
+    last_change = np.maximum.accumulate(np.where(base_changed, positions, -1))
+    dataframe['base_age'] = np.where(last_change >= 0, positions - last_change, 0)
+
+    return dataframe
@@ -0,0 +1,150 @@
+"""
+Numba rolling kernels for the RSI PNR calculation in RPSROIShort.
+
+numba is optional: when it is not installed NUMBA_AVAILABLE is False and the
+strategy falls back to its pandas implementation.
+
+Kernels are declared with explicit signatures, so numba compiles them eagerly
+when this module is imported (or loads them from the on-disk cache).
+Like pandas rolling windows, a window that contains NaN produces NaN; fastmath
+is left off so those NaN checks hold.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that leaves the function as plain Python"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit('float64[:](float64[:], int64)', cache=True)
+def rolling_min(x, window):
+    """
+    Rolling minimum over `window` bars, matching rolling(window).min().
+
+    Keeps a monotonic deque of bar indices whose values increase from head to
+    tail, so every bar is pushed and popped at most once.
+    """
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    if window < 1:
+        return out
+
+    deque = np.empty(n, dtype=np.int64)
+    head = 0
+    tail = 0
+    nan_count = 0
+    for i in range(n):
+        value = x[i]
+        if np.isnan(value):
+            nan_count += 1
+        else:
+            while tail > head and x[deque[tail - 1]] >= value:
+                tail -= 1
+            deque[tail] = i
+            tail += 1
+        if i >= window and np.isnan(x[i - window]):
+            nan_count -= 1
+        while tail > head and deque[head] <= i - window:
+            head += 1
+        if i >= window - 1 and nan_count == 0:
+            out[i] = x[deque[head]]
+
+    return out
+
+
+@njit('float64[:](float64[:], int64)', cache=True)
+def rolling_max(x, window):
+    """
+    Rolling maximum over `window` bars, matching rolling(window).max().
+
+    Same monotonic deque as rolling_min with the values decreasing instead.
+    """
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    if window < 1:
+        return out
+
+    deque = np.empty(n, dtype=np.int64)
+    head = 0
+    tail = 0
+    nan_count = 0
+    for i in range(n):
+        value = x[i]
+        if np.isnan(value):
+            nan_count += 1
+        else:
+            while tail > head and x[deque[tail - 1]] <= value:
+                tail -= 1
+            deque[tail] = i
+            tail += 1
+        if i >= window and np.isnan(x[i - window]):
+            nan_count -= 1
+        while tail > head and deque[head] <= i - window:
+            head += 1
+        if i >= window - 1 and nan_count == 0:
+            out[i] = x[deque[head]]
+
+    return out
+
+
+@njit('float64[:](float64[:], int64, float64)', cache=True)
+def rolling_quantile(x, window, quantile):
+    """
+    Rolling quantile with linear interpolation, matching
+    rolling(window).quantile(quantile).
+
+    The window is kept as a sorted buffer: each bar removes the value leaving
+    the window and inserts the new one at its binary-searched position, so the
+    quantile is read directly instead of re-sorting every window.
+    """
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    if window < 1 or n < window:
+        return out
+
+    position = quantile * (window - 1)
+    lower = int(position)
+    fraction = position - lower
+
+    window_sorted = np.empty(window)
+    count = 0
+    nan_count = 0
+    for i in range(n):
+        # Drop the value leaving the window
+        if i >= window:
+            old = x[i - window]
+            if np.isnan(old):
+                nan_count -= 1
+            else:
+                j = np.searchsorted(window_sorted[:count], old)
+                for k in range(j, count - 1):
+                    window_sorted[k] = window_sorted[k + 1]
+                count -= 1
+
+        # Insert the new value in order
+        value = x[i]
+        if np.isnan(value):
+            nan_count += 1
+        else:
+            j = np.searchsorted(window_sorted[:count], value)
+            for k in range(count, j, -1):
+                window_sorted[k] = window_sorted[k - 1]
+            window_sorted[j] = value
+            count += 1
+
+        if i >= window - 1 and nan_count == 0:
+            level = window_sorted[lower]
+            if fraction != 0.0:
+                level = level + (window_sorted[lower + 1] - level) * fraction
+            out[i] = level
+
+    return out